@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Simulated Agilent E3631A power supply with the interface of pyvisa used by
+Rattlesnake (ResourceManager.list_resources/open_resource, write, query,
+close), with the latencies of the RS-232 link and of the measurements.
+
+    rm = E3631ASimResourceManager()
+    supply = rm.open_resource(rm.list_resources()[-1])
+
+Benchmark of a voltage sweep with readback, from the root of the project:
+
+$ python -m LIB.AGILENT.e3631sim --vmax 10 --dwell 0.5
+
+"""
+
+import argparse
+import random
+import threading
+import time
+
+from LIB.AGILENT.sampler import ReadbackSampler
+from LIB.AGILENT.sweep import plan_sweep, run_sweep, sweep_duration
+from LIB.AGILENT.visaqueue import VisaCommandQueue
+
+SIM_RESOURCE_NAME = "ASRL::SIM::INSTR"
+E3631A_IDN = "HEWLETT-PACKARD,E3631A,0,2.1-5.0-1.0"
+
+# Output: (min voltage, max voltage, max current)
+E3631A_OUTPUTS = {"P6V": (0., 6.18, 5.15),
+                  "P25V": (0., 25.75, 1.03),
+                  "N25V": (-25.75, 0., 1.03)}
+
+E3631A_ERRORS = {0: "No error",
+                 -113: "Undefined header",
+                 -222: "Data out of range",
+                 -224: "Illegal parameter value"}
+
+
+class E3631ASimulator(object):
+    '''
+    Command interpreter of a simulated E3631A, used as a pyvisa resource
+
+    :param char_time: Transfer time of one character (s), 9600 bauds by
+                      default
+    :param measure_time: Duration of a MEAS? measurement (s)
+    :param load: Resistance of the load on the outputs (ohm)
+    :param noise: Standard deviation of the measurements (V or A)
+    :param seed: Seed of the noise
+    '''
+
+    def __init__(self, char_time=10 / 9600, measure_time=0.05, load=100.,
+                 noise=0.0005, seed=None):
+        self.char_time = char_time
+        self.measure_time = measure_time
+        self.load = load
+        self.noise = noise
+        self.random = random.Random(seed)
+        self.errors = []
+        self.command_count = 0
+        self.lock = threading.Lock()
+        self.timeout = 2000
+        self.reset()
+
+    def reset(self):
+        '''
+        State at power on (*RST)
+        '''
+        self.selected = "P6V"
+        self.voltage = dict.fromkeys(E3631A_OUTPUTS, 0.)
+        self.current = dict((name, limits[2]) for name, limits in E3631A_OUTPUTS.items())
+        self.output = False
+
+    # pyvisa resource interface
+
+    def write(self, message):
+        self.transfer(message)
+        with self.lock:
+            self.execute_message(message)
+        return len(message)
+
+    def query(self, message):
+        self.transfer(message)
+        with self.lock:
+            replies = self.execute_message(message)
+        reply = ";".join(reply for reply in replies if reply is not None)
+        self.transfer(reply)
+        return reply
+
+    def close(self):
+        pass
+
+    def transfer(self, message):
+        if self.char_time:
+            time.sleep((len(message) + 1) * self.char_time)
+
+    # Command interpreter
+
+    @staticmethod
+    def resolve_header(command, path):
+        '''
+        Absolute form of a command of a ';' separated message: a command
+        not starting with ':' is relative to the path of the previous one,
+        e.g. "CURR?" after "MEAS:VOLT?" is "MEAS:CURR?"
+
+        :param path: Header path of the previous command ("" at the start of
+                     the message)
+        :return: (absolute command, header path of the next command)
+        '''
+        command = command.strip()
+        if command.startswith("*"):
+            # Common commands don't change the path
+            return command, path
+        if command.startswith(":"):
+            command = command[1:]
+        else:
+            command = path + command
+        header = command.partition(" ")[0]
+        return command, header[:header.rfind(":") + 1]
+
+    def execute_message(self, message):
+        '''
+        Execute the ';' separated commands of a message
+
+        :return: Reply of each command (None if not a query)
+        '''
+        replies = []
+        path = ""
+        for command in message.strip().split(";"):
+            if command.strip():
+                command, path = self.resolve_header(command, path)
+                replies.append(self.execute(command))
+        return replies
+
+    def output_values(self):
+        '''
+        (voltage, current) delivered by the selected output into the load,
+        limited by the current setting (constant current mode)
+        '''
+        if not self.output:
+            return 0., 0.
+        voltage = self.voltage[self.selected]
+        current = abs(voltage) / self.load
+        limit = self.current[self.selected]
+        if current > limit:
+            current = limit
+            voltage = limit * self.load * (1 if voltage >= 0 else -1)
+        return voltage, current
+
+    def measure(self, value):
+        if self.measure_time:
+            time.sleep(self.measure_time)
+        return "%+.5E" % (value + self.random.gauss(0., self.noise))
+
+    def set_value(self, values, parameter, index):
+        try:
+            value = float(parameter)
+        except ValueError:
+            self.errors.append(-224)
+            return
+        limits = E3631A_OUTPUTS[self.selected]
+        low, high = (limits[0], limits[1]) if index == 0 else (0., limits[2])
+        if not low <= value <= high:
+            self.errors.append(-222)
+            return
+        values[self.selected] = value
+
+    def execute(self, command):
+        '''
+        Execute one SCPI command with an absolute header
+
+        :return: Reply of a query, None otherwise
+        '''
+        self.command_count += 1
+        header, _, parameter = command.strip().partition(" ")
+        header = header.upper().lstrip(":")
+        parameter = parameter.strip().upper()
+        if header == "*IDN?":
+            return E3631A_IDN
+        if header in ("*RST", "*CLS"):
+            if header == "*RST":
+                self.reset()
+            self.errors.clear()
+            return None
+        if header in ("SYST:ERR?", "SYSTEM:ERROR?"):
+            code = self.errors.pop(0) if self.errors else 0
+            return '%+d,"%s"' % (code, E3631A_ERRORS[code])
+        if header in ("INST", "INST:SEL", "INSTRUMENT", "INSTRUMENT:SELECT"):
+            if parameter in E3631A_OUTPUTS:
+                self.selected = parameter
+            else:
+                self.errors.append(-224)
+            return None
+        if header in ("INST?", "INST:SEL?"):
+            return self.selected
+        if header in ("VOLT", "VOLTAGE", "VOLT:LEV", "VOLT:IMM"):
+            self.set_value(self.voltage, parameter, 0)
+            return None
+        if header in ("VOLT?", "VOLTAGE?"):
+            return "%+.8E" % self.voltage[self.selected]
+        if header in ("CURR", "CURRENT", "CURR:LEV", "CURR:IMM"):
+            self.set_value(self.current, parameter, 1)
+            return None
+        if header in ("CURR?", "CURRENT?"):
+            return "%+.8E" % self.current[self.selected]
+        if header in ("OUTP", "OUTPUT", "OUTP:STAT"):
+            if parameter in ("ON", "1", "OFF", "0"):
+                self.output = parameter in ("ON", "1")
+            else:
+                self.errors.append(-224)
+            return None
+        if header in ("OUTP?", "OUTPUT?"):
+            return "1" if self.output else "0"
+        if header in ("MEAS?", "MEAS:VOLT?", "MEASURE:VOLTAGE?", "MEAS:VOLT:DC?"):
+            return self.measure(self.output_values()[0])
+        if header in ("MEAS:CURR?", "MEASURE:CURRENT?", "MEAS:CURR:DC?"):
+            return self.measure(self.output_values()[1])
+        self.errors.append(-113)
+        return None
+
+
+class E3631ASimResourceManager(object):
+    '''
+    Replacement of pyvisa.ResourceManager giving a simulated E3631A
+
+    :param simulator_options: Options of E3631ASimulator
+    '''
+
+    def __init__(self, **simulator_options):
+        self.simulator_options = simulator_options
+
+    def list_resources(self):
+        return (SIM_RESOURCE_NAME,)
+
+    def open_resource(self, resource_name, **kwargs):
+        if resource_name != SIM_RESOURCE_NAME:
+            raise Exception(f"Unknown simulated resource {resource_name}")
+        return E3631ASimulator(**self.simulator_options)
+
+
+def benchmark(vmin=0., vmax=10., vstep=1., dwell=0.5, readback_period=0.2,
+              **simulator_options):
+    '''
+    Run a voltage sweep on the simulated supply through VisaCommandQueue,
+    with the readback sampler (disabled if readback_period is 0). A readback
+    holds the serial link about 0.15 s: a VOLT command waits for it, the
+    dwell must be longer.
+
+    :return: dict with the "planned" and "elapsed" durations (s), the
+             "max_lateness" of the voltage commands (s) and the number of
+             "readbacks"
+    '''
+    supply = VisaCommandQueue(E3631ASimulator(**simulator_options), name="E3631A-SIM")
+    supply.write("INST P25V")
+    supply.write("OUTP ON")
+    supply.flush()
+    plan = plan_sweep(vmin, vmax, vstep, dwell, cycletype="updown")
+    issued = []
+    sampler = ReadbackSampler(supply, readback_period, lambda *values: None)
+    if readback_period > 0:
+        sampler.start()
+    start = time.monotonic()
+
+    def set_voltage(voltage):
+        supply.write("VOLT {:.1f}".format(voltage)).result()
+        issued.append(time.monotonic() - start)
+
+    run_sweep(plan, set_voltage)
+    elapsed = time.monotonic() - start
+    sampler.stop()
+    supply.close()
+    return {"planned": sweep_duration(plan),
+            "elapsed": elapsed,
+            "max_lateness": max(t - planned for t, planned in zip(issued, plan["time"])),
+            "readbacks": sampler.sample_count}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Voltage sweep benchmark on a simulated E3631A")
+    parser.add_argument("--vmin", type=float, default=0.)
+    parser.add_argument("--vmax", type=float, default=10.)
+    parser.add_argument("--vstep", type=float, default=1.)
+    parser.add_argument("--dwell", type=float, default=0.5,
+                        help="duration of each voltage step in s")
+    parser.add_argument("--readback-period", type=float, default=0.2,
+                        help="period of MEAS:VOLT?;:MEAS:CURR? in s, 0 to disable it")
+    parser.add_argument("--measure-time", type=float, default=0.05,
+                        help="duration of one measurement in s")
+    args = parser.parse_args()
+    result = benchmark(args.vmin, args.vmax, args.vstep, args.dwell,
+                       args.readback_period, measure_time=args.measure_time)
+    print(f"planned {result['planned']:.3f} s, elapsed {result['elapsed']:.3f} s, "
+          f"commands late by at most {1000 * result['max_lateness']:.1f} ms, "
+          f"{result['readbacks']} readbacks")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Background measurement of the voltage and current really delivered by the
+power supply.
+
+Each tick sends one SCPI message with all the measurements, separated by
+';', through the VisaCommandQueue of the instrument: the readback shares the
+I/O thread of the commands instead of competing with it on the bus.
+
+"""
+
+import concurrent.futures
+import logging
+import threading
+import time
+
+from LIB.clock import ACQUISITION_CLOCK
+
+# The leading ':' of the second command resets the SCPI header path, without
+# it "MEAS:CURR?" would be read as MEAS:MEAS:CURR? (undefined header)
+READBACK_QUERY = "MEAS:VOLT?;:MEAS:CURR?"
+
+
+def parse_readback(reply):
+    '''
+    Values of the reply of a ';' separated query, e.g. "+1.0E+00;+2.5E-03"
+    '''
+    return [float(value) for value in reply.strip().replace(",", ";").split(";")]
+
+
+class ReadbackSampler(object):
+    '''
+    Thread measuring the output of the power supply at a fixed period
+
+    :param instrument: VisaCommandQueue of the power supply
+    :param period: Time between two measurements (s). The measurements take
+                   time, so the effective period is never below the duration
+                   of one query.
+    :param record: function(timestamp, voltage, current) called with each
+                   measurement, timestamp at the middle of the execution of
+                   the query by the I/O thread (the time spent waiting
+                   behind the other commands is not counted)
+    :param query: SCPI message of the measurements
+    :param timeout: Longest wait for a reply (s), a missing reply is logged
+                    and the next measurement is tried
+    :param to_timestamp: Conversion of the time.perf_counter_ns of the
+                         queue to the timestamps in s
+    '''
+
+    def __init__(self, instrument, period, record, query=READBACK_QUERY,
+                 timeout=5., to_timestamp=ACQUISITION_CLOCK.to_timestamp):
+        self.instrument = instrument
+        self.period = period
+        self.record = record
+        self.query = query
+        self.timeout = timeout
+        self.to_timestamp = to_timestamp
+        self.sample_count = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="AGILENT-readback",
+                                       daemon=True)
+        self.thread.start()
+
+    def run(self):
+        deadline = time.monotonic()
+        while not self.stop_event.is_set():
+            reply = self.instrument.query(self.query)
+            try:
+                values = parse_readback(reply.result(self.timeout))
+            except concurrent.futures.TimeoutError:
+                reply.cancel()
+                logging.warning(f"AGILENT: no readback after {self.timeout} s")
+            except Exception as e:
+                logging.warning(f"AGILENT: readback failed: {e}")
+            else:
+                self.record(self.to_timestamp((reply.issued_ns + reply.completed_ns) // 2),
+                            *values)
+                self.sample_count += 1
+            # Next tick on the fixed grid, or right now if late
+            now = time.monotonic()
+            deadline += self.period
+            if deadline < now:
+                deadline = now
+            self.stop_event.wait(deadline - now)
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
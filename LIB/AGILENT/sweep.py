@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Voltage sweeps of the power supply.
+
+The complete schedule (start time, voltage, dwell) is computed before the
+cycle, then executed against absolute deadlines of the monotonic clock: the
+time spent in the VISA writes and in the logging is taken from the dwell
+instead of being added to it, so the sweep ends when planned.
+
+"""
+
+import time
+
+import numpy as np
+
+SWEEP_STEP_FIELDS = [("time", np.float64),      # start of the step from the
+                                                # start of the sweep (s)
+                     ("voltage", np.float64),
+                     ("dwell", np.float64)]     # duration of the step (s)
+
+# Longest sleep between two checks of a stop request (s)
+SWEEP_STOP_CHECK_INTERVAL = 0.1
+
+
+def sweep_voltages(vstart, vstop, vstep):
+    '''
+    Voltages from vstart to vstop (included if reached exactly) by steps of
+    vstep, never beyond vstop, rounded to avoid the float accumulation of
+    np.arange
+    '''
+    vstep = abs(vstep)
+    if vstep == 0:
+        raise Exception("The voltage step must not be 0")
+    count = int(np.floor(abs(vstop - vstart) / vstep + 1e-9)) + 1
+    direction = 1 if vstop >= vstart else -1
+    return np.round(vstart + direction * vstep * np.arange(count), 6)
+
+
+def plan_sweep(vmin, vmax, vstep, dwelltime, dwelltimelow=0, cycletype="up",
+               back2vmin=False):
+    '''
+    Schedule of a voltage cycle
+
+    :param vmin, vmax, vstep: Voltage range and step (V)
+    :param dwelltime: Duration of each voltage step (s)
+    :param dwelltimelow: Duration of the return to vmin after each step, if
+                         back2vmin (s)
+    :param cycletype: "up" (vmin to vmax), "down" (vmax to vmin) or "updown"
+                      (vmin to vmax and back to vmin)
+    :param back2vmin: Go back to vmin after each voltage step
+    :return: Structured array of SWEEP_STEP_FIELDS, one row per voltage
+             command. The sweep ends at time + dwell of the last row.
+    '''
+    if cycletype == "up":
+        voltages = sweep_voltages(vmin, vmax, vstep)
+    elif cycletype == "down":
+        voltages = sweep_voltages(vmax, vmin, vstep)
+    elif cycletype == "updown":
+        up = sweep_voltages(vmin, vmax, vstep)
+        # The top of the cycle is not repeated
+        voltages = np.concatenate((up, up[-2::-1]))
+    else:
+        raise Exception(f"Unknown cycle type {cycletype}")
+
+    steps = []
+    for voltage in voltages:
+        steps.append((voltage, dwelltime))
+        if back2vmin and voltage != vmin:
+            steps.append((vmin, dwelltimelow))
+
+    plan = np.zeros(len(steps), dtype=SWEEP_STEP_FIELDS)
+    plan["voltage"] = [voltage for voltage, _ in steps]
+    plan["dwell"] = [dwell for _, dwell in steps]
+    plan["time"][1:] = np.cumsum(plan["dwell"])[:-1]
+    return plan
+
+
+def sweep_duration(plan):
+    '''
+    Planned duration of the sweep in s
+    '''
+    if plan.shape[0] == 0:
+        return 0.
+    return float(plan["time"][-1] + plan["dwell"][-1])
+
+
+def wait_until(deadline, should_stop=None, clock=time.monotonic):
+    '''
+    Sleep until the deadline of the clock
+
+    :return: False if should_stop() returned True before the deadline
+    '''
+    while True:
+        remaining = deadline - clock()
+        if remaining <= 0:
+            return True
+        if should_stop is not None and should_stop():
+            return False
+        time.sleep(min(remaining, SWEEP_STOP_CHECK_INTERVAL))
+
+
+def run_sweep(plan, set_voltage, record=None, should_stop=None,
+              clock=time.monotonic, timestamp=None):
+    '''
+    Execute a sweep plan: each voltage is set at its planned time from the
+    start of the sweep, whatever the duration of the previous commands.
+
+    :param plan: Schedule given by plan_sweep
+    :param set_voltage: function(voltage) sending the voltage command. It
+                        may return the timestamp at which the instrument
+                        got the command, recorded instead of the time of
+                        its return.
+    :param record: function(timestamp, voltage) called when a voltage is
+                   set and at the end of its dwell
+    :param should_stop: function() returning True to interrupt the sweep
+    :param clock: Monotonic clock in s
+    :param timestamp: function() giving the timestamps of record, by default
+                      the monotonic clock anchored to time.time() at the
+                      start of the sweep
+    :return: True if the sweep was completed, False if interrupted
+    '''
+    start = clock()
+    if timestamp is None:
+        wall_start = time.time()
+
+        def timestamp():
+            return wall_start + clock() - start
+
+    for time_offset, voltage, dwell in plan:
+        if not wait_until(start + time_offset, should_stop, clock):
+            return False
+        sent = set_voltage(voltage)
+        if record is not None:
+            record(timestamp() if sent is None else sent, voltage)
+        if not wait_until(start + time_offset + dwell, should_stop, clock):
+            return False
+        if record is not None:
+            record(timestamp(), voltage)
+    return True
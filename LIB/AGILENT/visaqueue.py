@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Non blocking access to a VISA instrument.
+
+The commands are executed in order by a thread dedicated to the resource,
+the callers (e.g. the GUI thread) only queue them and get a
+concurrent.futures.Future of the result:
+
+    instrument = VisaCommandQueue(rm.open_resource(address))
+    instrument.write("VOLT 1.0")
+    idn = instrument.query("*IDN?").result(timeout=2)
+
+Each future has the issued_ns and completed_ns attributes: time.perf_counter_ns
+at the start and at the end of the execution of its command.
+
+A setpoint (VOLT, CURR) not sent yet is replaced by the next setpoint of the
+same kind queued right after it: clicking quickly on a jog button does not
+pile up commands the instrument would execute one after the other.
+
+"""
+
+import collections
+import concurrent.futures
+import logging
+import threading
+import time
+
+# Commands whose last value is the only one that matters
+COALESCED_COMMANDS = ("VOLT", "VOLTAGE", "CURR", "CURRENT")
+
+
+def command_header(command):
+    '''
+    SCPI header of a command, e.g. "VOLT" for "VOLT 1.5"
+    '''
+    return command.strip().split(" ", 1)[0].upper()
+
+
+class VisaCommandQueue(object):
+    '''
+    Command queue of one VISA resource executed by its own I/O thread
+
+    :param resource: Opened pyvisa resource (or any object with write(),
+                     query() and close())
+    :param name: Name of the I/O thread
+    '''
+
+    def __init__(self, resource, name="VISA"):
+        self.resource = resource
+        # [kind, command, futures] of the commands not executed yet
+        self.pending = collections.deque()
+        self.condition = threading.Condition()
+        self.running = True
+        self.coalesced_count = 0
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, kind, command):
+        future = concurrent.futures.Future()
+        with self.condition:
+            if not self.running:
+                raise Exception("VISA command queue closed")
+            last = self.pending[-1] if self.pending else None
+            if kind == "write" and last is not None and last[0] == "write" \
+                    and command_header(command) in COALESCED_COMMANDS \
+                    and command_header(last[1]) == command_header(command):
+                # Superseded setpoint: only the new value is sent
+                last[1] = command
+                last[2].append(future)
+                self.coalesced_count += 1
+            else:
+                self.pending.append([kind, command, [future]])
+                self.condition.notify()
+        return future
+
+    def write(self, command):
+        '''
+        Queue a command without reply
+
+        :return: Future resolved once the command is written
+        '''
+        return self.submit("write", command)
+
+    def query(self, command):
+        '''
+        Queue a command with a reply
+
+        :return: Future of the reply
+        '''
+        return self.submit("query", command)
+
+    def wait(self, seconds):
+        '''
+        Queue a pause of the I/O thread, e.g. to let the output settle
+        before the next command
+        '''
+        return self.submit("wait", seconds)
+
+    def flush(self, timeout=None):
+        '''
+        Block until the commands queued so far are executed
+        '''
+        return self.submit("wait", 0).result(timeout)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+                if not self.pending:
+                    break
+                kind, command, futures = self.pending.popleft()
+            futures = [future for future in futures
+                       if future.set_running_or_notify_cancel()]
+            if not futures:
+                continue
+            issued_ns = time.perf_counter_ns()
+            try:
+                if kind == "write":
+                    result = self.resource.write(command)
+                elif kind == "query":
+                    result = self.resource.query(command)
+                else:
+                    time.sleep(command)
+                    result = None
+            except Exception as e:
+                logging.warning(f"VISA: {command} failed: {e}")
+                result = e
+            completed_ns = time.perf_counter_ns()
+            for future in futures:
+                future.issued_ns = issued_ns
+                future.completed_ns = completed_ns
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def close(self, timeout=None):
+        '''
+        Execute the commands already queued, stop the I/O thread and close
+        the resource
+        '''
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join(timeout)
+        self.resource.close()
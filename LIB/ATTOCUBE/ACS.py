@@ -1,10 +1,17 @@
 # -*- coding: utf-8 -*-
 
+import os
 import sys
+import queue
 import socket
 import json
+import time
+import random
+import asyncio
+import functools
 
-from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Lock, Condition, local
 try:
     import netifaces
 except:
@@ -13,21 +20,92 @@ except:
 import urllib.request
 import xml.dom.minidom as minidom
 
+# Devices found by the last discovery
+DISCOVERY_CACHE = os.path.join(os.path.expanduser("~"), ".attocube_devices.json")
+# Number of device descriptions downloaded in parallel
+DISCOVERY_WORKERS = 16
+
 class AttoException(Exception):
     def __init__(self, errorText = None, errorNumber = 0):
         self.errorText = errorText
         self.errorNumber = errorNumber
 
 
+class AttoConnectionError(AttoException):
+    """ The connection was lost and could not be used to complete the
+    request.
+    """
+    pass
+
+
+class _CapturedRequest(Exception):
+    """ Raised by Device.request while Device.gather collects the requests
+    of the interface calls.
+    """
+    def __init__(self, method, params):
+        self.method = method
+        self.params = params
+
+
 class Device(object):
     TCP_PORT   = 9090
     is_open    = False
     request_id = 0
+    # Send the requests of requestMany/gather as one JSON-RPC batch array
+    # instead of consecutive requests. Disabled automatically if the
+    # firmware rejects batches.
+    use_batch  = False
+    # Responses cached by method: {method: time to live in s, None: no
+    # expiry}. Only successful responses are cached.
+    cache_ttl  = {}
+    # Methods clearing cached responses: {method: [cached methods or
+    # interface names, "*": everything]}
+    cache_invalidation = {}
+    socket_timeout = 10
+    # Reconnection after a broken connection or a timeout: the attempts are
+    # separated by an exponential delay in s with a random jitter.
+    reconnect_attempts  = 5
+    reconnect_delay     = 0.5
+    reconnect_max_delay = 8
+    # Number of times an idempotent request is sent again after a reconnection
+    request_retries = 2
+    # Upper bounds in s of the latency histogram
+    latency_bounds = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5,
+                      1, 2, 5, 10, float("inf"))
 
     def __init__(self, address):
         self.address  = address
         self.language = 0
         self.apiversion = 2
+        # Responses read while waiting for another id
+        self.pending_responses = {}
+        # State of gather() for the calling thread
+        self.gather_state = local()
+        # Several threads can share the connection: the requests are written
+        # one at a time and the thread reading the socket hands over the
+        # responses of the others by id.
+        self.send_lock = Lock()
+        self.response_condition = Condition()
+        self.reading = False
+        # {(method, params): (expiry time, response)}
+        self.cache = {}
+        # {method: [hits, misses]}
+        self.cache_stats = {}
+        self.cache_lock = Lock()
+        # Incremented at each reconnection: the requests sent on a previous
+        # connection will not be answered
+        self.generation = 0
+        self.reconnect_lock = Lock()
+        # Connection statistics, updated by all the requesting threads
+        self.stats_lock = Lock()
+        self.reconnect_count = 0
+        self.connection_failures = 0
+        self.latency_histogram = [0] * len(self.latency_bounds)
+        self.latency_total = 0.
+        self.last_latency = None
+        # time.perf_counter_ns at the sending and at the response of the
+        # last request of each thread
+        self.request_times = local()
 
     def __del__(self):
         self.close()
@@ -38,14 +116,19 @@ class Device(object):
         """
         if not self.is_open:
             tcp = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            tcp.settimeout(10)
+            tcp.settimeout(self.socket_timeout)
             tcp.connect((self.address, self.TCP_PORT))
             self.tcp = tcp
+            # Separate reader and writer: a write on a "rw" file drops the
+            # lines already read ahead, which other threads may wait for
             if sys.version_info[0] > 2:
-                self.bufferedSocket = tcp.makefile("rw", newline='\r\n')
+                self.bufferedSocket = tcp.makefile("r", newline='\r\n')
+                self.socketWriter = tcp.makefile("w", newline='\r\n')
             else:
-                self.bufferedSocket = tcp.makefile("rw")
+                self.bufferedSocket = tcp.makefile("r")
+                self.socketWriter = tcp.makefile("w")
             self.is_open = True
+            self.invalidateCache()
 
     def close(self):
         """
@@ -54,11 +137,12 @@ class Device(object):
         -------
         """
         if self.is_open:
+            self.socketWriter.close()
             self.bufferedSocket.close()
             self.tcp.close()
             self.is_open = False
 
-    def sendRequest(self, method, params=False):
+    def buildRequest(self, method, params=False):
         req = {
                 "jsonrpc": "2.0",
                 "method": method,
@@ -67,21 +151,332 @@ class Device(object):
                 }
         if params:
             req["params"] = params
-        self.bufferedSocket.write(json.dumps(req))
-        self.bufferedSocket.flush()
         self.request_id = self.request_id + 1
+        return req
+
+    def sendRequest(self, method, params=False):
+        with self.send_lock:
+            req = self.buildRequest(method, params)
+            self.socketWriter.write(json.dumps(req))
+            self.socketWriter.flush()
+        return req["id"]
 
     def getResponse(self):
         response = self.bufferedSocket.readline()
+        if not response:
+            raise ConnectionError("connection closed by the device")
         return json.loads(response)
 
+    def waitResponse(self, request_id, batch_error=False, generation=None):
+        """ Returns the response of the given request id. Responses to other
+        requests read in the meantime are kept for their threads.
+
+        Parameters
+        ----------
+        request_id : int
+        batch_error : bool
+            Also return the error without id answered to a rejected batch
+        generation : int
+            Connection generation the request was sent on
+        """
+        ids = [request_id, None] if batch_error else [request_id]
+        while True:
+            with self.response_condition:
+                while self.reading and not any([i in self.pending_responses for i in ids]) \
+                        and generation in (None, self.generation):
+                    self.response_condition.wait()
+                if generation not in (None, self.generation):
+                    raise AttoConnectionError("connection lost while waiting for the response")
+                for i in ids:
+                    if i in self.pending_responses:
+                        return self.pending_responses.pop(i)
+                # No other thread is reading: read for everybody
+                self.reading = True
+            try:
+                response = self.getResponse()
+            finally:
+                with self.response_condition:
+                    self.reading = False
+                    self.response_condition.notify_all()
+            with self.response_condition:
+                for item in (response if isinstance(response, list) else [response]):
+                    self.pending_responses[item.get("id")] = item
+
     def request(self,method,params=False):
         """ Synchronous request.
         """
+        if getattr(self.gather_state, "capture", False):
+            raise _CapturedRequest(method, params)
+        replay = getattr(self.gather_state, "replay", None)
+        if replay:
+            return replay.pop(0)
+        self.checkConnected()
+        if method in self.cache_ttl:
+            return self.cachedRequest(method, params)
+        if method in self.cache_invalidation:
+            self.invalidateCache(self.cache_invalidation[method])
+        return self.retrying([method], lambda generation:
+                             self.waitResponse(self.sendRequest(method, params),
+                                               generation=generation))
+
+    def checkConnected(self):
         if not self.is_open:
-            raise AttoException("not connected, use connect()");
-        self.sendRequest(method, params)
-        return self.getResponse()
+            # Wait for a reconnection in progress
+            with self.reconnect_lock:
+                pass
+            if not self.is_open:
+                raise AttoException("not connected, use connect()");
+
+    def isIdempotent(self, method):
+        """ Requests which can be sent again safely after a reconnection
+        """
+        return method.rsplit(".", 1)[-1].startswith("get") or method in self.cache_ttl
+
+    def retrying(self, methods, send):
+        """ Runs send(generation), reconnecting and running it again if the
+        connection is lost and all the methods are idempotent.
+
+        Raises
+        ------
+        AttoConnectionError
+            The connection was lost during a non idempotent request (which
+            may have been executed or not) or could not be restored.
+        """
+        retries = 0
+        while True:
+            self.checkConnected()
+            generation = self.generation
+            issued_ns = time.perf_counter_ns()
+            try:
+                result = send(generation)
+            except (OSError, ValueError, AttoConnectionError) as e:
+                # ValueError: file closed by a reconnection or truncated line
+                with self.stats_lock:
+                    self.connection_failures += 1
+                self.reconnect(generation)
+                if not all([self.isIdempotent(method) for method in methods]):
+                    raise AttoConnectionError("Connection lost during %s (%s), it may not have been executed"
+                                              % (", ".join(methods), e))
+                retries += 1
+                if retries > self.request_retries:
+                    raise AttoConnectionError("Connection lost during %s (%s)" % (", ".join(methods), e))
+                continue
+            completed_ns = time.perf_counter_ns()
+            self.request_times.issued_ns = issued_ns
+            self.request_times.completed_ns = completed_ns
+            self.recordLatency((completed_ns - issued_ns) / 1e9)
+            return result
+
+    def reconnect(self, generation=None):
+        """ Closes the connection and connects again, with exponential backoff
+        between the attempts. Does nothing if another thread has reconnected
+        since the given connection generation.
+        """
+        with self.reconnect_lock:
+            if generation is not None and generation != self.generation:
+                return
+            try:
+                try:
+                    self.close()
+                except OSError:
+                    self.is_open = False
+                delay = self.reconnect_delay
+                error = None
+                for attempt in range(self.reconnect_attempts):
+                    time.sleep(random.uniform(delay / 2, delay))
+                    try:
+                        self.connect()
+                        with self.stats_lock:
+                            self.reconnect_count += 1
+                        return
+                    except OSError as e:
+                        error = e
+                        delay = min(2 * delay, self.reconnect_max_delay)
+                raise AttoConnectionError("Could not reconnect to %s: %s" % (self.address, error))
+            finally:
+                with self.response_condition:
+                    self.generation += 1
+                    self.pending_responses.clear()
+                    self.response_condition.notify_all()
+
+    def recordLatency(self, latency):
+        with self.stats_lock:
+            for i, bound in enumerate(self.latency_bounds):
+                if latency <= bound:
+                    self.latency_histogram[i] += 1
+                    break
+            self.latency_total += latency
+            self.last_latency = latency
+
+    def lastRequestTimes(self):
+        """ Returns
+        -------
+        (issued_ns, completed_ns) : tuple
+            time.perf_counter_ns at the sending and at the response of the
+            last request sent to the device by the calling thread, (None,
+            None) if none
+        """
+        return (getattr(self.request_times, "issued_ns", None),
+                getattr(self.request_times, "completed_ns", None))
+
+    def connectionHealth(self):
+        """ Returns
+        -------
+        health : dict
+            "connected", "reconnects", "failures" (lost connections or
+            timeouts), "requests", "mean_latency" and "last_latency" in s,
+            "latency_histogram" ({upper bound in s: number of requests})
+        """
+        with self.stats_lock:
+            requests = sum(self.latency_histogram)
+            return {"connected": self.is_open,
+                    "reconnects": self.reconnect_count,
+                    "failures": self.connection_failures,
+                    "requests": requests,
+                    "mean_latency": self.latency_total / requests if requests else None,
+                    "last_latency": self.last_latency,
+                    "latency_histogram": dict(zip(self.latency_bounds, self.latency_histogram))}
+
+    def cachedRequest(self, method, params=False):
+        """ Request answered from the cache while the cached response is
+        valid (see cache_ttl).
+        """
+        key = (method, json.dumps(params))
+        with self.cache_lock:
+            stats = self.cache_stats.setdefault(method, [0, 0])
+            expiry, response = self.cache.get(key, (0, None))
+            if response is not None and (expiry is None or expiry > time.monotonic()):
+                stats[0] += 1
+                return response
+            stats[1] += 1
+        response = self.retrying([method], lambda generation:
+                                 self.waitResponse(self.sendRequest(method, params),
+                                                   generation=generation))
+        if not response.get('error', False) and response['result'][0] == 0:
+            ttl = self.cache_ttl[method]
+            with self.cache_lock:
+                self.cache[key] = (None if ttl is None else time.monotonic() + ttl,
+                                   response)
+        return response
+
+    def invalidateCache(self, names=None):
+        """ Clears cached responses.
+
+        Parameters
+        ----------
+        names : list of cached methods or interface names, "*" for all the
+            responses. Default: all the responses
+        """
+        with self.cache_lock:
+            if names is None or "*" in names:
+                self.cache.clear()
+                return
+            for key in list(self.cache):
+                if key[0] in names or key[0].rsplit(".", 1)[0] in names:
+                    del self.cache[key]
+
+    def cacheStatistics(self):
+        """ Returns
+        -------
+        statistics : {method: (hits, misses)}
+        """
+        with self.cache_lock:
+            return dict([(method, tuple(stats)) for method, stats in self.cache_stats.items()])
+
+    def requestMany(self, requests, batch=None):
+        """ Pipelined requests: all the requests are sent before reading the
+        responses, which costs one network round trip.
+
+        Parameters
+        ----------
+        requests : list of (method, params) tuples
+        batch : bool
+            Send a JSON-RPC batch array instead of consecutive requests.
+            Default: use_batch
+
+        Returns
+        -------
+        responses : list of the responses, in the order of the requests
+        """
+        self.checkConnected()
+        if len(requests) == 0:
+            return []
+        if batch is None:
+            batch = self.use_batch
+        for method, params in requests:
+            if method in self.cache_invalidation:
+                self.invalidateCache(self.cache_invalidation[method])
+        def sendMany(generation):
+            with self.send_lock:
+                reqs = [self.buildRequest(method, params) for method, params in requests]
+                if batch:
+                    self.socketWriter.write(json.dumps(reqs))
+                else:
+                    self.socketWriter.write("".join([json.dumps(req) for req in reqs]))
+                self.socketWriter.flush()
+
+            responses = []
+            if batch:
+                # A firmware without batch support answers with a single
+                # error without id
+                response = self.waitResponse(reqs[0]["id"], batch_error=True,
+                                             generation=generation)
+                if response.get("id") is None:
+                    return None
+                responses.append(response)
+            return responses + [self.waitResponse(req["id"], generation=generation)
+                                for req in reqs[len(responses):]]
+
+        responses = self.retrying([method for method, _ in requests], sendMany)
+        if responses is None:
+            self.use_batch = False
+            return self.requestMany(requests, batch=False)
+        return responses
+
+    def gather(self, calls, batch=None):
+        """ Runs several interface calls with one network round trip.
+
+        Each call is first run to collect its request, then the requests are
+        sent together (see requestMany) and each call is run again on its
+        response, so the results are decoded and checked as usual.
+
+        Parameters
+        ----------
+        calls : list of functions without argument, e.g.
+            [ids.system.getCurrentMode,
+             lambda: ids.displacement.getAxisSignalQuality(0)]
+        batch : bool
+            See requestMany
+
+        Returns
+        -------
+        results : list of the results of the calls
+        """
+        requests = []
+        counts = []
+        for call in calls:
+            self.gather_state.capture = True
+            try:
+                call()
+                counts.append(0)
+            except _CapturedRequest as captured:
+                requests.append((captured.method, captured.params))
+                counts.append(1)
+            finally:
+                self.gather_state.capture = False
+
+        responses = self.requestMany(requests, batch)
+        results = []
+        for call, count in zip(calls, counts):
+            # Requests made after the first one (e.g. apply() of a setter or
+            # errorNumberToString) are sent synchronously
+            self.gather_state.replay = responses[:count]
+            responses = responses[count:]
+            try:
+                results.append(call())
+            finally:
+                self.gather_state.replay = None
+        return results
 
     def printError(self, errorNumber):
         """ Converts the errorNumber into an error string an prints it to the
@@ -101,7 +496,51 @@ class Device(object):
         return errNo
 
     @staticmethod
-    def discover(cls):
+    def discover(cls, timeout=2, callback=None, cache_file=DISCOVERY_CACHE):
+        """ Discovers the devices of the given class (e.g. "ids") on all the
+        network interfaces. The devices of the cache file are also queried
+        directly, so that they are found where multicast is filtered.
+
+        Parameters
+        ----------
+        cls : str
+        timeout : float
+            Time in s to wait for the answers to the multicast search
+        callback : function(ip, deviceInfo), optional
+            Called as soon as a device has answered
+        cache_file : str
+            File where the found devices are saved (None: no cache)
+
+        Returns
+        -------
+        deviceInfos : {ip: (serialNumber, ipAddress, macAddress,
+                            friendlyName, modelName, lockedStatus)}
+        """
+        deviceInfos = {}
+        known = Device.knownDevices(cls, cache_file) if cache_file else {}
+        for ip, deviceInfo in Device.iterDiscover(cls, timeout, list(known)):
+            deviceInfos[ip] = deviceInfo
+            if callback is not None:
+                callback(ip, deviceInfo)
+        if cache_file:
+            Device.saveKnownDevices(cls, deviceInfos, cache_file)
+        return deviceInfos
+
+    @staticmethod
+    def iterDiscover(cls, timeout=2, addresses=()):
+        """ Generator of the (ip, deviceInfo) of the devices of the given
+        class, in the order of their answers. The multicast search runs on
+        all the interfaces at the same time and the device descriptions are
+        downloaded in parallel.
+
+        Parameters
+        ----------
+        cls : str
+        timeout : float
+            Time in s to wait for the answers to the multicast search
+        addresses : list of str
+            Addresses also queried directly
+        """
         try:
             network_ifaces = netifaces.interfaces()
         except NameError:
@@ -110,7 +549,7 @@ class Device(object):
             print("pip install netifaces")
             print("\nPython3:")
             print("pip3 install netifaces")
-            return {}
+            network_ifaces = []
 
         msg = \
            'M-SEARCH * HTTP/1.1\r\n' \
@@ -120,37 +559,71 @@ class Device(object):
            'MAN:"ssdp:discover"\r\n' \
            '\r\n'
 
-        def send_and_recv(iface, devices, devices_lock):
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-            s.bind((iface, 0))
-            s.settimeout(2)
-            s.sendto(str.encode(msg), ('239.255.255.250', 1900))
-            try:
-                while True:
-                    _, addr = s.recvfrom(65507)
-                    devices_lock.acquire()
-                    devices.append(addr[0])
-                    devices_lock.release()
-            except socket.timeout:
-                pass
-
-        thread_pool = []
-        devices = []
+        results = queue.Queue()
+        devices = set()
+        fetches = []
         devices_lock = Lock()
 
-        for iface in network_ifaces:
-            addr = netifaces.ifaddresses(iface)
-            if netifaces.AF_INET not in addr:
-                continue
-            for ip in addr[netifaces.AF_INET]:
-                if "addr" not in ip:
+        with ThreadPoolExecutor(max_workers=DISCOVERY_WORKERS) as executor:
+            def fetch(ip):
+                try:
+                    results.put((ip, Device.getDeviceInfo(ip, timeout)))
+                except Exception:
+                    results.put((ip, None))
+
+            def found(ip):
+                with devices_lock:
+                    if ip not in devices:
+                        devices.add(ip)
+                        fetches.append(executor.submit(fetch, ip))
+
+            def send_and_recv(iface):
+                s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+                try:
+                    s.bind((iface, 0))
+                    s.settimeout(timeout)
+                    s.sendto(str.encode(msg), ('239.255.255.250', 1900))
+                    while True:
+                        _, addr = s.recvfrom(65507)
+                        found(addr[0])
+                except (socket.timeout, OSError):
+                    pass
+                finally:
+                    s.close()
+
+            for ip in addresses:
+                found(ip)
+
+            thread_pool = []
+            for iface in network_ifaces:
+                addr = netifaces.ifaddresses(iface)
+                if netifaces.AF_INET not in addr:
+                    continue
+                for ip in addr[netifaces.AF_INET]:
+                    if "addr" not in ip:
+                        continue
+                    thread_pool.append(Thread(target=send_and_recv, args=(ip["addr"],)))
+                    thread_pool[-1].start()
+
+            received = 0
+            while any([thread.is_alive() for thread in thread_pool]) or received < len(fetches):
+                try:
+                    ip, deviceInfo = results.get(timeout=0.05)
+                except queue.Empty:
                     continue
-                thread_pool.append(Thread(target=send_and_recv, args=(ip["addr"], devices, devices_lock)))
-                thread_pool[-1].start()
+                received += 1
+                if deviceInfo is not None:
+                    yield ip, deviceInfo
 
-        for thread in thread_pool:
-            thread.join()
+    @staticmethod
+    def getDeviceInfo(ip, timeout=2):
+        """ Reads the description of the device at the given address.
 
+        Returns
+        -------
+        deviceInfo : (serialNumber, ipAddress, macAddress, friendlyName,
+                      modelName, lockedStatus)
+        """
         def getElementData(xmlNode, tag):
             tagNodes = xmlNode.getElementsByTagName(tag)
             if len(tagNodes) == 0:
@@ -160,30 +633,233 @@ class Device(object):
                 return None
             return childNodes[0].data
 
-        deviceInfos = {}
-        for ip in devices:
+        location = "http://" + ip + ":49000/upnp.xml"
+        response = urllib.request.urlopen(location, timeout=timeout)
+        response = response.read()
+        xmlNode = minidom.parseString(response)
+
+        serialNumber = getElementData(xmlNode, 'serialNumber')
+        ipAddress = getElementData(xmlNode, 'ipAddress')
+        macAddress = getElementData(xmlNode, 'macAddress')
+        friendlyName = getElementData(xmlNode, 'friendlyName')
+        modelName = getElementData(xmlNode, 'modelName')
+        lockedStatus = getElementData(xmlNode, 'lockedStatus')
+
+        return (
+            serialNumber,
+            ipAddress,
+            macAddress,
+            friendlyName,
+            modelName,
+            lockedStatus
+        )
+
+    @staticmethod
+    def knownDevices(cls, cache_file=DISCOVERY_CACHE):
+        """ Devices of the given class found by the last discovery, to connect
+        at startup without waiting for a new discovery.
+
+        Returns
+        -------
+        deviceInfos : same as discover
+        """
+        try:
+            with open(cache_file) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return dict([(ip, tuple(deviceInfo)) for ip, deviceInfo in cache.get(str(cls), {}).items()])
+
+    @staticmethod
+    def saveKnownDevices(cls, deviceInfos, cache_file=DISCOVERY_CACHE):
+        """ Adds the devices to the cache file. The devices already cached
+        are kept: a device which did not answer this time (e.g. switched
+        off) is still tried at the next startup.
+        """
+        try:
+            with open(cache_file) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        known = cache.get(str(cls), {})
+        known.update(deviceInfos)
+        cache[str(cls)] = known
+        try:
+            with open(cache_file, "w") as f:
+                json.dump(cache, f, indent=1)
+        except OSError:
+            pass
+
+
+class _FunctionError(Exception):
+    """ Raised by _ReplayDevice.handleError when the function returned an
+    error number, which AsyncInterface converts with errorNumberToString.
+    """
+    def __init__(self, errorNumber):
+        self.errorNumber = errorNumber
+
+
+class _ReplayDevice(object):
+    """ Device given to the generated interface classes by AsyncInterface.
+    Without response, request() only reports the request to send. With the
+    response, the generated method decodes it as usual.
+    """
+    def __init__(self):
+        self.response = None
+
+    def request(self, method, params=False):
+        if self.response is None:
+            raise _CapturedRequest(method, params)
+        return self.response
+
+    def handleError(self, response, ignoreFunctionError=False):
+        if response.get('error', False):
+            raise AttoException("JSON error in %s" % response['error'])
+        errNo = response['result'][0]
+        if (errNo != 0 and errNo != 'null' and not ignoreFunctionError):
+            raise _FunctionError(errNo)
+        return errNo
+
+
+class AsyncInterface(object):
+    """ asyncio version of a generated interface class: every method of the
+    class becomes a coroutine with the same parameters and results.
+
+    Parameters
+    ----------
+    interface : generated interface class, e.g. Displacement
+    device : AsyncDevice
+    """
+    def __init__(self, interface, device):
+        self.device = device
+        self.replay = _ReplayDevice()
+        self.interface = interface(self.replay)
+        self.interface_name = self.interface.interface_name
+
+    def __getattr__(self, name):
+        method = getattr(self.interface, name)
+        if name.startswith("_") or not callable(method):
+            return method
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            self.replay.response = None
+            try:
+                method(*args, **kwargs)
+            except _CapturedRequest as captured:
+                response = await self.device.request(captured.method, captured.params)
+            else:
+                raise AttoException("%s does not send a request" % name)
+            # No await until the end of the decoding: the other tasks cannot
+            # use the replay device meanwhile
+            self.replay.response = response
+            try:
+                return method(*args, **kwargs)
+            except _FunctionError as error:
+                errNo = error.errorNumber
+            finally:
+                self.replay.response = None
+            raise AttoException(("Error! " + str(await self.device.system_service.errorNumberToString(self.device.language, errNo))), errNo)
+
+        setattr(self, name, call)
+        return call
+
+
+class AsyncDevice(object):
+    """ asyncio version of Device. Requests of several tasks are sent without
+    waiting for the previous responses, which are dispatched by id, so one
+    event loop can poll several devices concurrently.
+    """
+    TCP_PORT   = 9090
+    is_open    = False
+    request_id = 0
+
+    def __init__(self, address):
+        self.address  = address
+        self.language = 0
+        self.apiversion = 2
+        self.pending_responses = {}
+        self.reader_task = None
+
+    async def connect(self, timeout=10):
+        """
+            Initializes and connects the selected device.
+        """
+        if not self.is_open:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.address, self.TCP_PORT), timeout)
+            self.reader_task = asyncio.ensure_future(self.readResponses())
+            self.is_open = True
+
+    async def close(self):
+        """
+            Closes the connection to the device.
+        """
+        if self.is_open:
+            self.is_open = False
+            self.reader_task.cancel()
+            self.writer.close()
             try:
-                location = "http://" + ip + ":49000/upnp.xml"
-                response = urllib.request.urlopen(location)
-                response = response.read()
-                xmlNode = minidom.parseString(response)
-
-                serialNumber = getElementData(xmlNode, 'serialNumber')
-                ipAddress = getElementData(xmlNode, 'ipAddress')
-                macAddress = getElementData(xmlNode, 'macAddress')
-                friendlyName = getElementData(xmlNode, 'friendlyName')
-                modelName = getElementData(xmlNode, 'modelName')
-                lockedStatus = getElementData(xmlNode, 'lockedStatus')
-
-                deviceInfos[ip] = (
-                    serialNumber,
-                    ipAddress,
-                    macAddress,
-                    friendlyName,
-                    modelName,
-                    lockedStatus
-                )
-            except:
+                await self.writer.wait_closed()
+            except Exception:
                 pass
 
-        return deviceInfos
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def readResponses(self):
+        """ Dispatches the responses to the waiting requests until the
+        connection is closed.
+        """
+        error = AttoException("connection closed")
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                for item in (response if isinstance(response, list) else [response]):
+                    future = self.pending_responses.pop(item.get("id"), None)
+                    if future is not None and not future.done():
+                        future.set_result(item)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            error = e
+        self.is_open = False
+        for future in self.pending_responses.values():
+            if not future.done():
+                future.set_exception(error)
+        self.pending_responses.clear()
+
+    async def request(self, method, params=False):
+        """ Asynchronous request.
+        """
+        if not self.is_open:
+            raise AttoException("not connected, use connect()");
+        req = {
+                "jsonrpc": "2.0",
+                "method": method,
+                "id": self.request_id,
+                "api": self.apiversion
+                }
+        if params:
+            req["params"] = params
+        self.request_id = self.request_id + 1
+        future = asyncio.get_event_loop().create_future()
+        self.pending_responses[req["id"]] = future
+        self.writer.write(json.dumps(req).encode())
+        await self.writer.drain()
+        return await future
+
+    async def handleError(self, response, ignoreFunctionError=False):
+        if response.get('error', False):
+            raise AttoException("JSON error in %s" % response['error'])
+        errNo = response['result'][0]
+        if (errNo != 0 and errNo != 'null' and not ignoreFunctionError):
+            raise AttoException(("Error! " + str(await self.system_service.errorNumberToString(self.language ,errNo))), errNo)
+        return errNo
@@ -19,7 +19,55 @@ try:
 except Exception:
     pass
 
+SYSTEM = "com.attocube.system."
+IDS_AXIS = "com.attocube.ids.axis."
+IDS_PILOTLASER = "com.attocube.ids.pilotlaser."
+IDS_REALTIME = "com.attocube.ids.realtime."
+IDS_SYSTEM = "com.attocube.ids.system."
+
+# Slow-changing values (time to live in s, None: constant)
+CACHE_TTL = {
+    SYSTEM + "errorNumberToString": None,
+    SYSTEM + "errorNumberToRecommendation": None,
+    SYSTEM + "getDeviceName": 60,
+    SYSTEM + "getFirmwareVersion": None,
+    SYSTEM + "getMacAddress": None,
+    SYSTEM + "getSerialNumber": None,
+    IDS_SYSTEM + "getDeviceType": None,
+    IDS_SYSTEM + "getFpgaVersion": None,
+    IDS_SYSTEM + "getFeaturesName": None,
+    IDS_SYSTEM + "getNbrFeaturesActivated": None,
+    IDS_SYSTEM + "getInitMode": 60,
+    IDS_AXIS + "getMasterAxis": 60,
+    IDS_AXIS + "getPassMode": 60,
+    IDS_PILOTLASER + "getEnabled": 60,
+    IDS_REALTIME + "getRtOutMode": 60,
+    IDS_REALTIME + "getRtDistanceMode": 60,
+}
+
+CACHE_INVALIDATION = {
+    SYSTEM + "setDeviceName": [SYSTEM + "getDeviceName"],
+    SYSTEM + "apply": [SYSTEM + "getDeviceName"],
+    SYSTEM + "factoryReset": ["*"],
+    SYSTEM + "rebootSystem": ["*"],
+    "com.attocube.system.update.uploadSoftwareImageBase64": ["*"],
+    "com.attocube.system.update.uploadLicenseBase64": ["*"],
+    IDS_SYSTEM + "setInitMode": [IDS_SYSTEM + "getInitMode"],
+    IDS_AXIS + "setMasterAxis": [IDS_AXIS[:-1]],
+    IDS_AXIS + "setPassMode": [IDS_AXIS[:-1]],
+    IDS_AXIS + "apply": [IDS_AXIS[:-1]],
+    IDS_AXIS + "discard": [IDS_AXIS[:-1]],
+    IDS_PILOTLASER + "enable": [IDS_PILOTLASER + "getEnabled"],
+    IDS_PILOTLASER + "disable": [IDS_PILOTLASER + "getEnabled"],
+    IDS_REALTIME + "setRtOutMode": [IDS_REALTIME[:-1]],
+    IDS_REALTIME + "setRtDistanceMode": [IDS_REALTIME[:-1]],
+    IDS_REALTIME + "apply": [IDS_REALTIME[:-1]],
+    IDS_REALTIME + "discard": [IDS_REALTIME[:-1]],
+}
+
 class Device(ACS.Device):
+    cache_ttl = CACHE_TTL
+    cache_invalidation = CACHE_INVALIDATION
 
     def __init__ (self, address):
     
@@ -47,5 +95,29 @@ class Device(ACS.Device):
             else:
                 raise e
 
-def discover():
-    return Device.discover("ids")
\ No newline at end of file
+class AsyncDevice(ACS.AsyncDevice):
+
+    def __init__ (self, address):
+
+        super().__init__(address)
+
+        self.about = ACS.AsyncInterface(About, self)
+        self.access = ACS.AsyncInterface(Access, self)
+        self.adjustment = ACS.AsyncInterface(Adjustment, self)
+        self.axis = ACS.AsyncInterface(Axis, self)
+        self.displacement = ACS.AsyncInterface(Displacement, self)
+        self.ecu = ACS.AsyncInterface(Ecu, self)
+        self.manual = ACS.AsyncInterface(Manual, self)
+        self.network = ACS.AsyncInterface(Network, self)
+        self.nlc = ACS.AsyncInterface(Nlc, self)
+        self.pilotlaser = ACS.AsyncInterface(Pilotlaser, self)
+        self.realtime = ACS.AsyncInterface(Realtime, self)
+        self.system = ACS.AsyncInterface(System, self)
+        self.system_service = ACS.AsyncInterface(System_service, self)
+        self.update = ACS.AsyncInterface(Update, self)
+
+def discover(timeout=2, callback=None, cache_file=ACS.DISCOVERY_CACHE):
+    return Device.discover("ids", timeout, callback, cache_file)
+
+def knownDevices(cache_file=ACS.DISCOVERY_CACHE):
+    return Device.knownDevices("ids", cache_file)
\ No newline at end of file
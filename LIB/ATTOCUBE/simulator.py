@@ -0,0 +1,626 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for an IDS3010, to run the client, the streaming and the GUI
+without the hardware.
+
+    python simulator.py --noise 1000 --drift 50000
+
+starts the JSON-RPC server on port 9090 and the position stream on port
+9091 (read with SimulatedStream instead of Stream).
+"""
+import argparse
+import datetime
+import inspect
+import json
+import math
+import re
+import socket
+import socketserver
+import threading
+import time
+
+import numpy as np
+
+import IDS
+
+from streaming.decoder import PACKETS_PER_SECOND, \
+                              packetDtype, \
+                              samplesPerPacket
+from streaming.stream import Stream
+
+STREAM_PORT = 9091
+# First byte of every packet header, never valid in UTF-8: the parser of
+# the recordings stops reading the text header at the first packet
+PACKET_MARKER = 0xFF
+
+MODE_IDLE = "system idle"
+MODE_MEASUREMENT_STARTING = "measurement starting"
+MODE_MEASUREMENT_RUNNING = "measurement running"
+MODE_ALIGNMENT_STARTING = "optics alignment starting"
+MODE_ALIGNMENT_RUNNING = "optics alignment running"
+
+# Error numbers returned by the simulator
+ERROR_NONE = 0
+ERROR_WRONG_MODE = 1
+ERROR_NOT_MEASURING = 2
+ERROR_STRINGS = {ERROR_NONE: "No error",
+                 ERROR_WRONG_MODE: "Not possible in the current mode",
+                 ERROR_NOT_MEASURING: "Measurement not running"}
+
+# Values returned by the getters which were never set (zeros otherwise)
+DEFAULT_VALUES = {
+    "com.attocube.system.getDeviceName": ["IDS simulator"],
+    "com.attocube.system.getFirmwareVersion": ["simulator"],
+    "com.attocube.system.getHostname": ["localhost"],
+    "com.attocube.system.getMacAddress": ["00:00:00:00:00:00"],
+    "com.attocube.system.getSerialNumber": ["SIM000000"],
+    "com.attocube.ids.system.getDeviceType": ["IDS3010"],
+    "com.attocube.ids.system.getFpgaVersion": ["simulator"],
+    "com.attocube.ids.adjustment.getContrastInPermille": [900, 1000, 900],
+    "com.attocube.ids.displacement.getAxisSignalQuality": [900, 1000],
+    "com.attocube.ids.displacement.getSignalQuality": [900, 1000],
+    "com.attocube.ids.pilotlaser.getEnabled": [False],
+}
+
+
+def interfaceMethods():
+    """
+    Methods of the generated interface classes of IDS.Device
+
+    Returns
+    -------
+    methods : {method: (parameter count, result count)}
+        Method names as sent on the network, e.g.
+        "com.attocube.ids.system.getCurrentMode"
+    """
+    methods = {}
+    device = IDS.Device("")
+    for interface in vars(device).values():
+        if not hasattr(interface, "interface_name"):
+            continue
+        for name, function in inspect.getmembers(type(interface), inspect.isfunction):
+            if name.startswith("_"):
+                continue
+            params = [param for param in inspect.signature(function).parameters
+                      if param not in ("self", "ignoreFunctionError")]
+            indices = re.findall(r"response\['result'\]\[(\d+)\]", inspect.getsource(function))
+            methods[interface.interface_name + "." + name] = \
+                (len(params), max([int(i) for i in indices]) + 1 if indices else 1)
+    return methods
+
+
+class PositionGenerator(object):
+    """
+    Synthetic positions: offset + drift * t + amplitude * sin(2 pi frequency t)
+    plus white noise, in pm.
+
+    Parameters
+    ----------
+    intervalInMicroseconds : int
+        Sample interval
+    channelIds : list(int)
+        Generated axes
+    noise : float
+        Standard deviation of the noise in pm
+    drift : float
+        Drift in pm/s
+    amplitude : float
+        Amplitude of the oscillation in pm
+    frequency : float
+        Frequency of the oscillation in Hz
+    offsets : list(float)
+        Position of each axis (0, 1, 2) at t = 0 in pm
+    seed : int, optional
+        Seed of the noise
+    """
+    def __init__(self, intervalInMicroseconds=1000, channelIds=(0, 1, 2),
+                 noise=1000., drift=0., amplitude=0., frequency=1.,
+                 offsets=(0., 0., 0.), seed=None):
+        self.intervalInMicroseconds = intervalInMicroseconds
+        self.channelIds = list(channelIds)
+        self.noise = noise
+        self.drift = drift
+        self.amplitude = amplitude
+        self.frequency = frequency
+        self.offsets = list(offsets)
+        self.perPacketSampleCount = samplesPerPacket(intervalInMicroseconds)
+        self.rng = np.random.default_rng(seed)
+        self.sampleIndex = 0
+        self.packetIndex = 0
+
+    def positionAt(self, t, axis):
+        """
+        Position of an axis at the time t in s, without noise
+        """
+        return self.offsets[axis] + self.drift * t + \
+               self.amplitude * math.sin(2 * math.pi * self.frequency * t)
+
+    def positions(self, sampleCount):
+        """
+        Next samples of the generated axes
+
+        Returns
+        -------
+        positions : numpy.ndarray
+            int64 array of shape (len(channelIds), sampleCount) in pm
+        """
+        t = np.arange(self.sampleIndex, self.sampleIndex + sampleCount) \
+            * self.intervalInMicroseconds * 1e-6
+        self.sampleIndex += sampleCount
+        signal = self.drift * t + self.amplitude * np.sin(2 * np.pi * self.frequency * t)
+        positions = np.empty((len(self.channelIds), sampleCount), dtype=np.int64)
+        for i, axis in enumerate(self.channelIds):
+            positions[i] = self.offsets[axis] + signal + \
+                           self.noise * self.rng.standard_normal(sampleCount)
+        return positions
+
+    def packets(self, packetCount):
+        """
+        Next samples encoded as stream packets (see streaming.decoder)
+
+        Returns
+        -------
+        data : bytes
+        """
+        channelCount = len(self.channelIds)
+        perPacketSampleCount = self.perPacketSampleCount
+        positions = self.positions(packetCount * perPacketSampleCount)
+        positions = positions.reshape(channelCount, packetCount, perPacketSampleCount)
+
+        packets = np.zeros(packetCount, dtype=packetDtype(perPacketSampleCount, channelCount))
+        # Packet counter above the marker byte (little endian: first byte)
+        packets["header"] = (np.arange(self.packetIndex, self.packetIndex + packetCount)
+                             << 8) | PACKET_MARKER
+        self.packetIndex += packetCount
+        base = positions[:, :, 0]
+        deltas = positions[:, :, 1:] - base[:, :, np.newaxis]
+        packets["channels"]["base"] = base.T
+        packets["channels"]["deltas"] = np.clip(deltas, -2**31, 2**31 - 1).transpose(1, 0, 2)
+        return packets.tobytes()
+
+
+class IdsSimulator(object):
+    """
+    JSON-RPC server answering the methods of the generated interface classes
+    (com.attocube.*) and streaming synthetic positions.
+
+    getCurrentMode follows startMeasurement/startOpticsAlignment:
+    "system idle" -> "measurement starting" -> "measurement running" after
+    startDuration. Setters store their values, which are returned by the
+    corresponding getters.
+
+    Parameters
+    ----------
+    host : str
+    port : int
+        JSON-RPC port
+    streamPort : int
+        Port of the position stream, None to disable it
+    startDuration : float
+        Duration in s of "measurement starting" and "optics alignment
+        starting"
+    speed : float
+        Stream rate relative to the real rate (25 packets/s), None to send
+        the packets as fast as possible
+    acceptBatch : bool
+        Answer JSON-RPC batch arrays (otherwise rejected like an old
+        firmware)
+    generator : dict
+        Parameters of the PositionGenerator of the stream and of the position
+        getters (noise, drift, amplitude, frequency, offsets, seed)
+    """
+    def __init__(self, host="127.0.0.1", port=IDS.Device.TCP_PORT, streamPort=STREAM_PORT,
+                 startDuration=1., speed=1., acceptBatch=True, **generator):
+        self.host = host
+        self.port = port
+        self.streamPort = streamPort
+        self.startDuration = startDuration
+        self.speed = speed
+        self.acceptBatch = acceptBatch
+        self.generator = generator
+
+        self.methods = interfaceMethods()
+        self.handlers = {
+            "com.attocube.ids.system.getCurrentMode": self.getCurrentMode,
+            "com.attocube.ids.system.startMeasurement": self.startMeasurement,
+            "com.attocube.ids.system.stopMeasurement": self.stopMeasurement,
+            "com.attocube.ids.system.startOpticsAlignment": self.startOpticsAlignment,
+            "com.attocube.ids.system.stopOpticsAlignment": self.stopMeasurement,
+            "com.attocube.ids.displacement.getMeasurementEnabled": self.getMeasurementEnabled,
+            "com.attocube.ids.displacement.getAbsolutePosition": self.getAxisPosition,
+            "com.attocube.ids.displacement.getAxisDisplacement": self.getAxisPosition,
+            "com.attocube.ids.displacement.getAbsolutePositions": self.getAxesPositions,
+            "com.attocube.ids.displacement.getAxesDisplacement": self.getAxesPositions,
+            "com.attocube.ids.pilotlaser.enable": lambda: self.setPilotLaser(True),
+            "com.attocube.ids.pilotlaser.disable": lambda: self.setPilotLaser(False),
+            "com.attocube.system.errorNumberToString": self.errorNumberToString,
+            "com.attocube.system.errorNumberToRecommendation": self.errorNumberToString,
+        }
+
+        self.lock = threading.Lock()
+        self.registers = {}
+        self.mode = MODE_IDLE
+        self.modeTime = time.monotonic()
+        self.measurementStart = None
+        self.positionGenerator = PositionGenerator(**generator)
+        self.requestCount = 0
+        self.servers = []
+        self.threads = []
+
+    # JSON-RPC
+
+    def call(self, method, params):
+        """
+        Executes a method
+
+        Returns
+        -------
+        result : list
+            Error number followed by the values
+        """
+        if method not in self.methods:
+            raise KeyError(method)
+        with self.lock:
+            self.requestCount += 1
+            if method in self.handlers:
+                return self.handlers[method](*params)
+            return self.register(method, params)
+
+    def register(self, method, params):
+        """
+        Default behaviour: setters store their values, getters return them
+        """
+        interface, name = method.rsplit(".", 1)
+        if name.startswith("set"):
+            getter = interface + ".get" + name[3:]
+            keyCount = self.methods[getter][0] if getter in self.methods else 0
+            self.registers[(getter, tuple(params[:keyCount]))] = list(params[keyCount:])
+            return [ERROR_NONE]
+        resultCount = self.methods[method][1]
+        values = self.registers.get((method, tuple(params)),
+                                    DEFAULT_VALUES.get(method, [0] * (resultCount - 1)))
+        return [ERROR_NONE] + list(values)
+
+    def handle(self, request):
+        """
+        Response to one JSON-RPC request (dict)
+        """
+        response = {"jsonrpc": "2.0", "id": request.get("id")}
+        try:
+            response["result"] = self.call(request["method"], request.get("params", []))
+        except KeyError:
+            response["error"] = {"code": -32601, "message": "Method not found"}
+        except TypeError:
+            response["error"] = {"code": -32602, "message": "Invalid params"}
+        return response
+
+    # State machine
+
+    def currentMode(self):
+        elapsed = time.monotonic() - self.modeTime
+        if self.mode == MODE_MEASUREMENT_STARTING and elapsed >= self.startDuration:
+            self.mode = MODE_MEASUREMENT_RUNNING
+            self.measurementStart = time.monotonic()
+        elif self.mode == MODE_ALIGNMENT_STARTING and elapsed >= self.startDuration:
+            self.mode = MODE_ALIGNMENT_RUNNING
+        return self.mode
+
+    def setMode(self, mode):
+        self.mode = mode
+        self.modeTime = time.monotonic()
+
+    def getCurrentMode(self):
+        return [ERROR_NONE, self.currentMode()]
+
+    def startMeasurement(self):
+        if self.currentMode() != MODE_IDLE:
+            return [ERROR_WRONG_MODE]
+        self.setMode(MODE_MEASUREMENT_STARTING)
+        return [ERROR_NONE]
+
+    def startOpticsAlignment(self):
+        if self.currentMode() != MODE_IDLE:
+            return [ERROR_WRONG_MODE]
+        self.setMode(MODE_ALIGNMENT_STARTING)
+        return [ERROR_NONE]
+
+    def stopMeasurement(self):
+        self.setMode(MODE_IDLE)
+        self.measurementStart = None
+        return [ERROR_NONE]
+
+    def getMeasurementEnabled(self):
+        return [ERROR_NONE, self.currentMode() == MODE_MEASUREMENT_RUNNING]
+
+    def isMeasuring(self):
+        with self.lock:
+            return self.currentMode() == MODE_MEASUREMENT_RUNNING
+
+    # Positions
+
+    def position(self, axis):
+        if self.currentMode() != MODE_MEASUREMENT_RUNNING:
+            return None
+        generator = self.positionGenerator
+        t = time.monotonic() - self.measurementStart
+        return int(generator.positionAt(t, axis) +
+                   generator.noise * generator.rng.standard_normal())
+
+    def getAxisPosition(self, axis):
+        position = self.position(axis)
+        if position is None:
+            return [ERROR_NOT_MEASURING, 0]
+        return [ERROR_NONE, position]
+
+    def getAxesPositions(self):
+        positions = [self.position(axis) for axis in range(3)]
+        if None in positions:
+            return [ERROR_NOT_MEASURING, 0, 0, 0]
+        return [ERROR_NONE] + positions
+
+    def setPilotLaser(self, enabled):
+        self.registers[("com.attocube.ids.pilotlaser.getEnabled", ())] = [enabled]
+        return [ERROR_NONE]
+
+    def errorNumberToString(self, language, errNbr):
+        return [ERROR_NONE, ERROR_STRINGS.get(errNbr, "Unknown error %s" % errNbr)]
+
+    # Servers
+
+    def start(self):
+        """
+        Starts the servers in background threads
+        """
+        simulator = self
+
+        class RpcHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                simulator.serveRpc(self.request)
+
+        class StreamHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                simulator.serveStream(self.request)
+
+        handlers = [(self.port, RpcHandler)]
+        if self.streamPort is not None:
+            handlers.append((self.streamPort, StreamHandler))
+        for port, handler in handlers:
+            server = socketserver.ThreadingTCPServer((self.host, port), handler,
+                                                     bind_and_activate=False)
+            server.daemon_threads = True
+            server.allow_reuse_address = True
+            server.server_bind()
+            server.server_activate()
+            self.servers.append(server)
+            self.threads.append(threading.Thread(target=server.serve_forever, daemon=True))
+            self.threads[-1].start()
+        return self
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.servers = []
+        self.threads = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def serveRpc(self, connection):
+        """
+        Answers the requests of one client. The requests are concatenated
+        JSON objects (or batch arrays), the responses are \\r\\n terminated
+        lines.
+        """
+        decoder = json.JSONDecoder()
+        buffer = ""
+        try:
+            while True:
+                data = connection.recv(65536)
+                if not data:
+                    return
+                buffer += data.decode("utf-8")
+                responses = []
+                while True:
+                    buffer = buffer.lstrip()
+                    if not buffer:
+                        break
+                    try:
+                        request, end = decoder.raw_decode(buffer)
+                    except ValueError:
+                        # Incomplete request
+                        break
+                    buffer = buffer[end:]
+                    if isinstance(request, list) and self.acceptBatch and request:
+                        responses.append([self.handle(item) for item in request])
+                    elif isinstance(request, dict):
+                        responses.append(self.handle(request))
+                    else:
+                        responses.append({"jsonrpc": "2.0", "id": None,
+                                          "error": {"code": -32600, "message": "Invalid Request"}})
+                if responses:
+                    connection.sendall("".join([json.dumps(response) + "\r\n"
+                                                for response in responses]).encode("utf-8"))
+        except OSError:
+            # Client gone in the middle of a request or of a response
+            pass
+        finally:
+            connection.close()
+
+    def serveStream(self, connection):
+        """
+        Streams packets to one client. The client sends
+        "<intervalInMicroseconds> <channelMask>\\n" and receives "OK\\n"
+        followed by the packets while the measurement is running.
+        """
+        request = connection.makefile("r").readline().split()
+        intervalInMicroseconds, channelMask = int(request[0]), int(request[1])
+        if not self.isMeasuring():
+            connection.sendall(b"ERROR measurement not running\n")
+            return
+        connection.sendall(b"OK\n")
+
+        parameters = dict(self.generator)
+        parameters.update(intervalInMicroseconds=intervalInMicroseconds,
+                          channelIds=[i for i in range(3) if channelMask & (1 << i)])
+        generator = PositionGenerator(**parameters)
+        start = time.monotonic()
+        try:
+            while self.isMeasuring():
+                if self.speed:
+                    due = int((time.monotonic() - start) * PACKETS_PER_SECOND * self.speed)
+                    packetCount = due - generator.packetIndex
+                    if packetCount <= 0:
+                        time.sleep(1. / PACKETS_PER_SECOND / self.speed)
+                        continue
+                else:
+                    packetCount = PACKETS_PER_SECOND
+                connection.sendall(generator.packets(packetCount))
+        except OSError:
+            pass
+
+
+class SimulatedStream(Stream):
+    """
+    Stream reading the positions sent by IdsSimulator, with the same
+    interface as Stream (decoded with NumPy).
+
+    Parameters
+    ----------
+    port : int
+        Stream port of the simulator
+    Other parameters: see Stream
+    """
+    def __init__(self, deviceAddress, isMaster, intervalInMicroseconds, filePath=None,
+                 axis0=False, axis1=False, axis2=False, port=STREAM_PORT):
+        super().__init__(deviceAddress, isMaster, intervalInMicroseconds, filePath,
+                         axis0, axis1, axis2)
+        self.native = False
+        self.port = port
+        self.socket = None
+        self.recordFile = None
+        self.receivedBytes = 0
+        self.recordSkip = 0
+        self.packetSize = packetDtype(self.perPacketSampleCount, len(self.channelIds)).itemsize
+
+    @property
+    def lastError(self):
+        return ""
+
+    def open(self):
+        if self.connected or self.handle != 0:
+            raise Exception("Stream already connected")
+        try:
+            connection = socket.create_connection((self.deviceAddress, self.port), timeout=10)
+        except OSError:
+            raise Exception("Cannot connect to IDS streaming. Maybe, the measurement is not running on all requested axes or Streaming is not running on your IDS.")
+        connection.sendall(("%d %d\n" % (self.intervalInMicroseconds, self.channelMask)).encode())
+        answer = b""
+        while not answer.endswith(b"\n"):
+            data = connection.recv(1)
+            if not data:
+                break
+            answer += data
+        if answer != b"OK\n":
+            connection.close()
+            raise Exception("Cannot connect to IDS streaming. Maybe, the measurement is not running on all requested axes or Streaming is not running on your IDS.")
+
+        self.socket = connection
+        self.handle = connection.fileno()
+        self.connected = True
+        self.receivedBytes = 0
+        if self.filePath is not None:
+            self.startRecording(self.filePath)
+
+    def close(self):
+        if not self.connected or self.handle == 0:
+            raise Exception("Stream not connected")
+        if self.recording:
+            self.stopRecording()
+        self.socket.close()
+        self.socket = None
+        self.handle = 0
+        self.connected = False
+
+    def readRaw(self, bufferSize):
+        buffer = np.empty(bufferSize, dtype=np.uint8)
+        return buffer[:self.readRawInto(buffer)].tobytes()
+
+    def readRawInto(self, raw, offset=0):
+        if not self.connected or self.handle == 0:
+            raise Exception("Stream not connected")
+        free = raw.shape[0] - offset
+        if free <= 0:
+            return 0
+        try:
+            length = self.socket.recv_into(memoryview(raw)[offset:], free)
+        except socket.timeout:
+            return 0
+        if length == 0:
+            # End of file without timeout: the simulator closed the stream,
+            # close() is still needed to release the socket and the recording
+            raise Exception("Stream disconnected")
+        if self.recording:
+            skip = min(self.recordSkip, length)
+            self.recordSkip -= skip
+            self.recordFile.write(raw[offset + skip:offset + length].tobytes())
+        self.receivedBytes += length
+        return length
+
+    def startRecording(self, filePath):
+        """
+        Records the stream to an .aws file, from the next packet
+        """
+        channels = ";".join(["id=Index,offs=0"] +
+                            ["id=Pos%d,offs=0" % i for i in self.channelIds])
+        self.recordFile = open(filePath, "wb")
+        self.recordFile.write(("Date: %s\r\nChannels: %s\r\nSampleInterval: %d\r\nSampleCount: %d\r\n"
+                               % (datetime.datetime.now().isoformat(), channels,
+                                  self.intervalInMicroseconds, self.perPacketSampleCount)).encode())
+        self.recordSkip = -self.receivedBytes % self.packetSize
+        self.recording = True
+
+    def stopRecording(self):
+        self.recordFile.close()
+        self.recordFile = None
+        self.recording = False
+
+
+def main(argv=None):
+    argParser = argparse.ArgumentParser(description="IDS3010 simulator")
+    argParser.add_argument("--host", default="127.0.0.1")
+    argParser.add_argument("--port", type=int, default=IDS.Device.TCP_PORT,
+                           help="JSON-RPC port (default: %(default)s)")
+    argParser.add_argument("--stream-port", type=int, default=STREAM_PORT,
+                           help="position stream port (default: %(default)s)")
+    argParser.add_argument("--start-duration", type=float, default=1.,
+                           help="duration of the measurement start in s (default: %(default)s)")
+    argParser.add_argument("--speed", type=float, default=1.,
+                           help="stream rate relative to the real rate, 0 for as fast as possible")
+    argParser.add_argument("--noise", type=float, default=1000.,
+                           help="noise standard deviation in pm (default: %(default)s)")
+    argParser.add_argument("--drift", type=float, default=0.,
+                           help="drift in pm/s (default: %(default)s)")
+    argParser.add_argument("--amplitude", type=float, default=0.,
+                           help="oscillation amplitude in pm (default: %(default)s)")
+    argParser.add_argument("--frequency", type=float, default=1.,
+                           help="oscillation frequency in Hz (default: %(default)s)")
+    args = argParser.parse_args(argv)
+
+    simulator = IdsSimulator(args.host, args.port, args.stream_port,
+                             args.start_duration, args.speed or None,
+                             noise=args.noise, drift=args.drift,
+                             amplitude=args.amplitude, frequency=args.frequency)
+    with simulator:
+        print("IDS simulator on %s:%d (stream %d)" % (args.host, args.port, args.stream_port))
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
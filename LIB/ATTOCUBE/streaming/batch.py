@@ -0,0 +1,220 @@
+import argparse
+import glob
+import mmap
+import os
+import os.path
+import time
+
+from concurrent.futures import ProcessPoolExecutor, \
+                               as_completed
+
+import numpy as np
+
+from .decoder import packetDtype
+from .file_parser import decodeChunks, \
+                         parseHeader, \
+                         sampleRange, \
+                         selectChannels
+
+# Maximum number of samples decoded by one task. Bigger files are split
+# on packet boundaries and decoded by several processes.
+SEGMENT_SAMPLE_COUNT = 1 << 24
+
+def outputDtype(headerParams, axes=None):
+    """
+    Structured dtype of the converted samples: time in s then the position
+    in pm of each selected axis
+    """
+    return np.dtype([("time", np.float64)] +
+                    [(f"axis{i_dst}", np.int64)
+                     for _, i_dst in selectChannels(headerParams, axes)])
+
+def prepareFile(filePath, outputPath, axes=None,
+                segmentSampleCount=SEGMENT_SAMPLE_COUNT):
+    """
+    Create the output file of a recording and split the conversion in
+    segments.
+
+    Parameters
+    ----------
+    filePath : str
+        Recorded stream file (.aws)
+    outputPath : str
+        Converted file (.npy of outputDtype), allocated by this function
+    axes : list(int), optional
+        Axes to convert, all the recorded axes by default
+    segmentSampleCount : int
+        Maximum number of samples per segment
+
+    Returns
+    -------
+    segments : list(tuple(int, int))
+        First and last (excluded) sample of each segment
+    """
+    with open(filePath, "rb") as file:
+        headerSize, headerParams = parseHeader(file)
+        file.seek(0, 2)
+        dtype = packetDtype(headerParams["perPacketSampleCount"],
+                            len(headerParams["channelIds"]))
+        packetCount = (file.tell() - headerSize) // dtype.itemsize
+    firstSample, lastSample = sampleRange(headerParams, packetCount)
+
+    output = np.lib.format.open_memmap(outputPath, mode="w+",
+                                       dtype=outputDtype(headerParams, axes),
+                                       shape=(lastSample - firstSample,))
+    del output
+
+    # Segments start on a packet boundary
+    perPacketSampleCount = headerParams["perPacketSampleCount"]
+    segmentSampleCount = max(perPacketSampleCount,
+                             segmentSampleCount - segmentSampleCount % perPacketSampleCount)
+    return [(start, min(start + segmentSampleCount, lastSample))
+            for start in range(firstSample, lastSample, segmentSampleCount)]
+
+def convertSegment(filePath, outputPath, firstSample, lastSample, axes=None):
+    """
+    Decode the samples [firstSample, lastSample[ of a recording into its
+    output file. Executed in the worker processes.
+
+    Returns
+    -------
+    sampleCount : int
+        Number of converted samples
+    started : float
+        Start of the decoding (time.time(), comparable between processes)
+    elapsed : float
+        Decoding time in s
+    """
+    started = time.time()
+    t0 = time.perf_counter()
+    output = np.load(outputPath, mmap_mode="r+")
+    with open(filePath, "rb") as file:
+        headerSize, headerParams = parseHeader(file)
+        channels = selectChannels(headerParams, axes)
+        dtype = packetDtype(headerParams["perPacketSampleCount"],
+                            len(headerParams["channelIds"]))
+        file.seek(0, 2)
+        packetCount = (file.tell() - headerSize) // dtype.itemsize
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            packets = np.frombuffer(mm, dtype=dtype, count=packetCount,
+                                    offset=headerSize)
+            try:
+                for chunkStart, chunkStop, chunk in decodeChunks(packets,
+                                                                 headerParams,
+                                                                 channels,
+                                                                 firstSample,
+                                                                 lastSample):
+                    block = output[chunkStart:chunkStop]
+                    block["time"] = np.arange(chunkStart, chunkStop) / headerParams["frequency"]
+                    for i_dst, axis in chunk.items():
+                        block[f"axis{i_dst}"] = axis
+            finally:
+                del packets
+    output.flush()
+    del output
+    return lastSample - firstSample, started, time.perf_counter() - t0
+
+def convertFiles(filePaths, outputDir=None, axes=None, maxWorkers=None,
+                 segmentSampleCount=SEGMENT_SAMPLE_COUNT):
+    """
+    Convert several recorded stream files in parallel. Each file is written
+    next to the recording (or in outputDir) as a .npy file of outputDtype.
+
+    Parameters
+    ----------
+    filePaths : list(str)
+        Recorded stream files (.aws)
+    outputDir : str, optional
+        Directory of the converted files
+    axes : list(int), optional
+        Axes to convert, all the recorded axes by default
+    maxWorkers : int, optional
+        Number of processes, the number of CPUs by default
+    segmentSampleCount : int
+        Maximum number of samples decoded by one task
+
+    Returns
+    -------
+    report : list(dict)
+        For each file: "file", "output", "samples", "bytes" (size of the
+        recording), "seconds" (from the start of the first segment of the
+        file to the end of its last one, the other files converted in
+        the meantime not counted), "decodeSeconds" (decoding time summed
+        over the processes) and "throughput" (MB/s over "seconds")
+    """
+    report = {}
+    with ProcessPoolExecutor(max_workers=maxWorkers) as executor:
+        futures = {}
+        for filePath in filePaths:
+            outputPath = os.path.splitext(filePath)[0] + ".npy"
+            if outputDir is not None:
+                outputPath = os.path.join(outputDir, os.path.basename(outputPath))
+            segments = prepareFile(filePath, outputPath, axes, segmentSampleCount)
+            report[filePath] = {"file": filePath,
+                                "output": outputPath,
+                                "samples": 0,
+                                "bytes": os.path.getsize(filePath),
+                                "seconds": 0.,
+                                "decodeSeconds": 0.,
+                                "throughput": 0.,
+                                "pending": len(segments),
+                                "started": None,
+                                "finished": None}
+            for firstSample, lastSample in segments:
+                future = executor.submit(convertSegment, filePath, outputPath,
+                                         firstSample, lastSample, axes)
+                futures[future] = filePath
+
+        for future in as_completed(futures):
+            stats = report[futures[future]]
+            sampleCount, started, elapsed = future.result()
+            stats["samples"] += sampleCount
+            stats["decodeSeconds"] += elapsed
+            stats["pending"] -= 1
+            if stats["started"] is None or started < stats["started"]:
+                stats["started"] = started
+            if stats["finished"] is None or started + elapsed > stats["finished"]:
+                stats["finished"] = started + elapsed
+
+    for stats in report.values():
+        # Files without any complete packet keep 0 s
+        if stats["started"] is not None:
+            stats["seconds"] = stats["finished"] - stats["started"]
+            if stats["seconds"] > 0:
+                stats["throughput"] = stats["bytes"] / 1e6 / stats["seconds"]
+        del stats["pending"], stats["started"], stats["finished"]
+    return list(report.values())
+
+def findRecordings(paths):
+    """
+    List the .aws files given directly or contained in the given directories
+    """
+    filePaths = []
+    for path in paths:
+        if os.path.isdir(path):
+            filePaths += sorted(glob.glob(os.path.join(path, "*.aws")))
+        else:
+            filePaths.append(path)
+    return filePaths
+
+def main(argv=None):
+    argParser = argparse.ArgumentParser(
+        description="Decode recorded IDS stream files (.aws) to .npy files in parallel")
+    argParser.add_argument("paths", nargs="+",
+                           help=".aws files or directories containing them")
+    argParser.add_argument("-o", "--output-dir", default=None,
+                           help="directory of the converted files (default: next to the recordings)")
+    argParser.add_argument("-a", "--axes", type=int, nargs="+", default=None,
+                           help="axes to convert (default: all the recorded axes)")
+    argParser.add_argument("-j", "--jobs", type=int, default=None,
+                           help="number of processes (default: number of CPUs)")
+    args = argParser.parse_args(argv)
+
+    report = convertFiles(findRecordings(args.paths), args.output_dir,
+                          args.axes, args.jobs)
+    for stats in report:
+        print(f"{stats['file']} -> {stats['output']}: {stats['samples']} samples "
+              f"in {stats['seconds']:.2f} s ({stats['throughput']:.1f} MB/s)")
+
+if __name__ == "__main__":
+    main()
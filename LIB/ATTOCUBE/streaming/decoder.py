@@ -0,0 +1,150 @@
+import numpy as np
+
+# Layout of one stream packet, as recorded in .aws files and sent on the
+# stream socket:
+#   int64 header
+#   for each channel:
+#       int64 base position (pm)
+#       int32 deltas to the base position for the following samples
+# All values are little endian.
+HEADER_DTYPE = np.dtype("<i8")
+BASE_DTYPE = np.dtype("<i8")
+DELTA_DTYPE = np.dtype("<i4")
+
+# The IDS sends 25 packets per second, with at most 1023 samples per packet
+PACKETS_PER_SECOND = 25
+MAX_SAMPLES_PER_PACKET = 1023
+
+
+def samplesPerPacket(intervalInMicroseconds):
+    """
+    Number of samples per channel contained in one stream packet
+
+    Parameters
+    ----------
+    intervalInMicroseconds : int
+        Sample rate of the position samples
+
+    Returns
+    -------
+    sampleCount : int
+        Number of samples per packet and channel
+    """
+    return int(min(MAX_SAMPLES_PER_PACKET,
+                   max(1, 1000000 / intervalInMicroseconds / PACKETS_PER_SECOND)))
+
+
+def packetSize(perPacketSampleCount, channelCount):
+    """
+    Size of one stream packet in Bytes
+
+    Parameters
+    ----------
+    perPacketSampleCount : int
+        Number of samples per packet and channel
+    channelCount : int
+        Number of streamed channels
+
+    Returns
+    -------
+    size : int
+        Size of one packet in Bytes
+    """
+    return packetDtype(perPacketSampleCount, channelCount).itemsize
+
+
+def packetDtype(perPacketSampleCount, channelCount):
+    """
+    Structured NumPy dtype matching one stream packet
+
+    Parameters
+    ----------
+    perPacketSampleCount : int
+        Number of samples per packet and channel
+    channelCount : int
+        Number of streamed channels
+
+    Returns
+    -------
+    dtype : numpy.dtype
+        Packed dtype with the fields "header" and "channels", the latter
+        holding "base" and "deltas" for each channel
+    """
+    channel = np.dtype([("base", BASE_DTYPE),
+                        ("deltas", DELTA_DTYPE, (perPacketSampleCount - 1,))])
+    return np.dtype([("header", HEADER_DTYPE),
+                     ("channels", channel, (channelCount,))])
+
+
+def decodePackets(buffer, perPacketSampleCount, channelCount, out=None):
+    """
+    Decode all complete packets contained in a raw stream buffer.
+
+    Parameters
+    ----------
+    buffer : bytes-like
+        Raw stream data, starting on a packet boundary. Trailing bytes of an
+        incomplete packet are ignored.
+    perPacketSampleCount : int
+        Number of samples per packet and channel
+    channelCount : int
+        Number of streamed channels
+    out : numpy.ndarray, optional
+        int64 array of shape (channelCount, N) to decode into. Only the
+        packets fitting into N samples are decoded.
+
+    Returns
+    -------
+    decodedBytes : int
+        Number of Bytes consumed from the buffer
+    positions : numpy.ndarray
+        int64 array of shape (channelCount, sampleCount) with the positions
+        in pm. A view on out if given.
+    """
+    dtype = packetDtype(perPacketSampleCount, channelCount)
+    packetCount = len(memoryview(buffer).cast("B")) // dtype.itemsize
+    if out is not None:
+        packetCount = min(packetCount, out.shape[1] // perPacketSampleCount)
+    sampleCount = packetCount * perPacketSampleCount
+
+    if out is None:
+        out = np.empty((channelCount, sampleCount), dtype=np.int64)
+    positions = out[:, :sampleCount]
+    if packetCount == 0:
+        return 0, positions
+
+    packets = np.frombuffer(buffer, dtype=dtype, count=packetCount)
+    channels = packets["channels"]
+    # (channel, packet, sample) view on the destination
+    dst = positions.reshape(channelCount, packetCount, perPacketSampleCount)
+    base = channels["base"].T
+    dst[:, :, 0] = base
+    np.add(channels["deltas"].transpose(1, 0, 2), base[:, :, np.newaxis],
+           out=dst[:, :, 1:])
+
+    return packetCount * dtype.itemsize, positions
+
+
+def decodeChannel(packets, channel, out):
+    """
+    Decode one channel of packets already mapped with packetDtype.
+
+    Parameters
+    ----------
+    packets : numpy.ndarray
+        Array of packets, e.g. np.frombuffer(data, dtype=packetDtype(...))
+    channel : int
+        Index of the channel in the packets
+    out : numpy.ndarray
+        int64 array of len(packets) * perPacketSampleCount samples
+
+    Returns
+    -------
+    out : numpy.ndarray
+        The decoded positions in pm
+    """
+    channels = packets["channels"][:, channel]
+    dst = out.reshape(packets.shape[0], -1)
+    dst[:, 0] = channels["base"]
+    np.add(channels["deltas"], channels["base"][:, np.newaxis], out=dst[:, 1:])
+    return out
@@ -11,31 +11,49 @@ if platform.architecture()[0] == '64bit':
 else:
     CURRENT_PATH = os.path.join(CURRENT_PATH, "x86")
 
+# The native library only exists for Windows. On other platforms the stream
+# decoding falls back on the NumPy decoder (see decoder.py) and only the
+# functions talking to the IDS socket are unavailable.
 if os.name == "nt":
     DLL_PATH = os.path.join(CURRENT_PATH, "Attocube.Common.NativeC.dll")
+    API = ctypes.cdll.LoadLibrary(DLL_PATH)
 else:
-    raise Exception("Streaming not supported on this platform")
+    DLL_PATH = None
+    API = None
 
-API = ctypes.cdll.LoadLibrary(DLL_PATH)
+NATIVE_AVAILABLE = API is not None
 
-_GetLastStreamError = API.GetLastStreamError
-_GetLastStreamError.restype = ctypes.c_int
+if NATIVE_AVAILABLE:
+    _GetLastStreamError = API.GetLastStreamError
+    _GetLastStreamError.restype = ctypes.c_int
 
-_OpenStream = API.OpenStream
-_OpenStream.restype = ctypes.c_void_p
+    _OpenStream = API.OpenStream
+    _OpenStream.restype = ctypes.c_void_p
 
-_CloseStream = API.CloseStream
+    _CloseStream = API.CloseStream
 
-_ReadStream = API.ReadStream
-_ReadStream.restype = ctypes.c_int
+    _ReadStream = API.ReadStream
+    _ReadStream.restype = ctypes.c_int
 
-_DecodeStreamSingle = API.DecodeStreamSingle
-_DecodeStreamSingle.restype = ctypes.c_int
+    _DecodeStreamSingle = API.DecodeStreamSingle
+    _DecodeStreamSingle.restype = ctypes.c_int
 
-_StartStreamRecording = API.StartStreamRecording
-_StartStreamRecording.restype = ctypes.c_bool
+    _StartStreamRecording = API.StartStreamRecording
+    _StartStreamRecording.restype = ctypes.c_bool
 
-_StopStreamRecording = API.StopStreamRecording
-_StopStreamRecording.restype = ctypes.c_bool
+    _StopStreamRecording = API.StopStreamRecording
+    _StopStreamRecording.restype = ctypes.c_bool
 
-_DecodePackets = API.DecodePackets
+    _DecodePackets = API.DecodePackets
+else:
+    def _notSupported(*args, **kwargs):
+        raise Exception("Streaming not supported on this platform")
+
+    _GetLastStreamError = _notSupported
+    _OpenStream = _notSupported
+    _CloseStream = _notSupported
+    _ReadStream = _notSupported
+    _DecodeStreamSingle = _notSupported
+    _StartStreamRecording = _notSupported
+    _StopStreamRecording = _notSupported
+    _DecodePackets = _notSupported
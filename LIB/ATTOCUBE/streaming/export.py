@@ -0,0 +1,250 @@
+import argparse
+import json
+import os.path
+
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+from LIB.clock import CLOCK_METADATA_SUFFIX
+
+from .batch import findRecordings
+from .file_parser import CHUNK_SAMPLE_COUNT, \
+                         iterColumns, \
+                         parseHeader, \
+                         selectChannels
+
+FORMATS = {"csv": ".csv",
+           "parquet": ".parquet",
+           "hdf5": ".h5"}
+
+DEFAULT_COMPRESSION = {"csv": None,
+                       "parquet": "zstd",
+                       "hdf5": "gzip"}
+
+# Rows formatted at once by exportCsv (bounds the size of the strings built)
+CSV_FORMAT_ROW_COUNT = 1 << 16
+
+def readClockMetadata(filePath):
+    """
+    Acquisition clock metadata of a recording
+
+    Returns
+    -------
+    metadata : dict(str, str)
+        Empty if the recording has no clock metadata
+    """
+    try:
+        with open(filePath + CLOCK_METADATA_SUFFIX) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+def fileMetadata(headerParams):
+    """
+    Parameters of the recording written in the exported files, with the
+    acquisition clock metadata if any (headerParams["clock"])
+
+    Returns
+    -------
+    metadata : dict(str, str)
+    """
+    metadata = {"recorded": headerParams["recorded"].isoformat()
+                            if "recorded" in headerParams else "",
+                "frequency": str(headerParams["frequency"]),
+                "perPacketSampleCount": str(headerParams["perPacketSampleCount"]),
+                "channels": ";".join(",".join(f"{key}={value}" for key, value in channel.items())
+                                     for channel in headerParams["channels"])}
+    metadata.update(headerParams.get("clock", {}))
+    return metadata
+
+def emptyBlock(headerParams, axes=None):
+    """
+    Block without samples with the columns of the selected axes, exported
+    instead of nothing when the recording or the time range is empty: the
+    exported file still has its metadata and its columns
+    """
+    block = {"startTime": 0.,
+             "time": np.empty(0, dtype=np.float64),
+             "axis0": None,
+             "axis1": None,
+             "axis2": None,
+             "header": headerParams}
+    for _, i_dst in selectChannels(headerParams, axes):
+        block[f"axis{i_dst}"] = np.empty(0, dtype=np.int64)
+    return block
+
+def blockColumns(block):
+    """
+    Names and arrays of the columns of a block given by iterColumns
+    """
+    names = ["time"] + [f"axis{i}" for i in range(3) if block[f"axis{i}"] is not None]
+    return names, [block[name] for name in names]
+
+def formatCsvRows(columns):
+    """
+    CSV lines of the rows of the columns (time, then the axes), formatted
+    with one % operation for all the rows instead of one per row as
+    np.savetxt does
+    """
+    rowCount = columns[0].shape[0]
+    rowFormat = ",".join(["%.9f"] + ["%d"] * (len(columns) - 1)) + "\n"
+    values = np.empty((rowCount, len(columns)), dtype=object)
+    for i, column in enumerate(columns):
+        values[:, i] = column.tolist()
+    return (rowFormat * rowCount) % tuple(values.ravel())
+
+def exportCsv(blocks, outputPath, compression=None):
+    with open(outputPath, "w", newline="") as file:
+        for i, block in enumerate(blocks):
+            names, columns = blockColumns(block)
+            if i == 0:
+                for key, value in fileMetadata(block["header"]).items():
+                    file.write(f"# {key}: {value}\n")
+                file.write(",".join(names) + "\n")
+            for start in range(0, columns[0].shape[0], CSV_FORMAT_ROW_COUNT):
+                file.write(formatCsvRows([column[start:start + CSV_FORMAT_ROW_COUNT]
+                                          for column in columns]))
+
+def exportParquet(blocks, outputPath, compression="zstd"):
+    if pyarrow is None:
+        raise Exception("Install pyarrow to export to Parquet")
+    writer = None
+    try:
+        for block in blocks:
+            names, columns = blockColumns(block)
+            table = pyarrow.table(dict(zip(names, columns)))
+            if writer is None:
+                schema = table.schema.with_metadata(fileMetadata(block["header"]))
+                writer = pyarrow.parquet.ParquetWriter(outputPath, schema,
+                                                       compression=compression)
+            writer.write_table(table.replace_schema_metadata(schema.metadata))
+    finally:
+        if writer is not None:
+            writer.close()
+
+def exportHdf5(blocks, outputPath, compression="gzip"):
+    if h5py is None:
+        raise Exception("Install h5py to export to HDF5")
+    with h5py.File(outputPath, "w") as file:
+        for block in blocks:
+            names, columns = blockColumns(block)
+            if not file.keys():
+                file.attrs.update(fileMetadata(block["header"]))
+                for name, column in zip(names, columns):
+                    file.create_dataset(name, shape=(0,), maxshape=(None,),
+                                        dtype=column.dtype,
+                                        chunks=(min(CHUNK_SAMPLE_COUNT, max(1, column.shape[0])),),
+                                        compression=compression, shuffle=compression is not None)
+            for name, column in zip(names, columns):
+                dataset = file[name]
+                size = dataset.shape[0]
+                dataset.resize((size + column.shape[0],))
+                dataset[size:] = column
+
+EXPORTERS = {"csv": exportCsv,
+             "parquet": exportParquet,
+             "hdf5": exportHdf5}
+
+def exportFile(filePath, outputPath=None, fileFormat="csv", compression="default",
+               tStart=None, tStop=None, axes=None,
+               chunkSampleCount=CHUNK_SAMPLE_COUNT):
+    """
+    Export a recorded stream file (.aws) block by block, without loading it
+    completely in memory.
+
+    Parameters
+    ----------
+    filePath : str
+        Recorded stream file
+    outputPath : str, optional
+        Exported file, the recording path with the extension of the format
+        by default
+    fileFormat : str, default: "csv"
+        "csv", "parquet" or "hdf5"
+    compression : str, optional
+        Compression of Parquet ("zstd" by default) or HDF5 ("gzip" by
+        default) files. None to disable it.
+    tStart : float, optional
+        Start time in s from the beginning of the recording
+    tStop : float, optional
+        Stop time in s (excluded)
+    axes : list(int), optional
+        Axes to export, all the recorded axes by default
+    chunkSampleCount : int
+        Number of samples decoded and written at once
+
+    Returns
+    -------
+    outputPath : str
+        Path of the exported file, with the metadata and the columns even
+        if no sample is in the time range
+    """
+    if fileFormat not in EXPORTERS:
+        raise Exception(f"Unknown export format {fileFormat}")
+    if outputPath is None:
+        outputPath = os.path.splitext(filePath)[0] + FORMATS[fileFormat]
+    if compression == "default":
+        compression = DEFAULT_COMPRESSION[fileFormat]
+
+    clockMetadata = readClockMetadata(filePath)
+
+    def withClock(blocks, headerParams):
+        empty = True
+        for block in blocks:
+            empty = False
+            block["header"]["clock"] = clockMetadata
+            yield block
+        if empty:
+            headerParams["clock"] = clockMetadata
+            yield emptyBlock(headerParams, axes)
+
+    with open(filePath, "rb") as file:
+        _, headerParams = parseHeader(file)
+        file.seek(0)
+        blocks = withClock(iterColumns(file, chunkSampleCount, tStart, tStop, axes),
+                           headerParams)
+        EXPORTERS[fileFormat](blocks, outputPath, compression)
+    return outputPath
+
+def main(argv=None):
+    argParser = argparse.ArgumentParser(
+        description="Export recorded IDS stream files (.aws) to CSV, Parquet or HDF5")
+    argParser.add_argument("paths", nargs="+",
+                           help=".aws files or directories containing them")
+    argParser.add_argument("-f", "--format", choices=sorted(EXPORTERS), default="csv",
+                           help="output format (default: csv)")
+    argParser.add_argument("-o", "--output-dir", default=None,
+                           help="directory of the exported files (default: next to the recordings)")
+    argParser.add_argument("-c", "--compression", default="default",
+                           help="Parquet/HDF5 compression, 'none' to disable it")
+    argParser.add_argument("-a", "--axes", type=int, nargs="+", default=None,
+                           help="axes to export (default: all the recorded axes)")
+    argParser.add_argument("--start", type=float, default=None,
+                           help="start time in s")
+    argParser.add_argument("--stop", type=float, default=None,
+                           help="stop time in s")
+    args = argParser.parse_args(argv)
+
+    compression = None if args.compression.lower() == "none" else args.compression
+    for filePath in findRecordings(args.paths):
+        outputPath = None
+        if args.output_dir is not None:
+            outputPath = os.path.join(args.output_dir,
+                                      os.path.splitext(os.path.basename(filePath))[0]
+                                      + FORMATS[args.format])
+        outputPath = exportFile(filePath, outputPath, args.format, compression,
+                                args.start, args.stop, args.axes)
+        print(f"{filePath} -> {outputPath}")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,21 @@
-import ctypes
+import math
+import mmap
+
+import numpy as np
 
 from dateutil import parser
 
-from .dll_wrapper import _DecodePackets
+from .decoder import decodeChannel, \
+                     decodePackets, \
+                     packetDtype, \
+                     packetSize
 from .stream import Stream
 
+# Number of packets decoded at once by the columnar loader
+CHUNK_PACKET_COUNT = 4096
+# Default number of samples per block yielded by iterColumns
+CHUNK_SAMPLE_COUNT = 1 << 20
+
 def parse(file):
     headerSize, headerParams = parseHeader(file)
     # reset to start of data buffer:
@@ -14,7 +25,7 @@ def parse(file):
 def parseHeader(file):
     headerSize = 0
     headerParams = {}
-    for line in file.readlines():
+    for line in file:
         try:
             params = line.decode("utf8").replace("\n", "").replace("\r", "").split(": ")
             headerSize += len(line)
@@ -37,53 +48,225 @@ def decodeFile(file, headerParams):
 
     result = []
 
-    packetSize = ctypes.sizeof(ctypes.c_int64) \
-                    + ((ctypes.sizeof(ctypes.c_int64) \
-                        + (ctypes.sizeof(ctypes.c_int32) * (headerParams["perPacketSampleCount"] - 1))
-                    ) * len(headerParams["channelIds"]))
-    bufferSize = packetSize * PACKET_BUFFER_LEN
+    perPacketSampleCount = headerParams["perPacketSampleCount"]
+    channelCount = len(headerParams["channelIds"])
+    bufferSize = packetSize(perPacketSampleCount, channelCount) * PACKET_BUFFER_LEN
+    offsets = np.array([int(headerParams["channels"][i_src+1]["offs"])
+                        for i_src in range(channelCount)], dtype=np.int64)
+    srcFreq = headerParams["frequency"]
 
     buffer_c = bytearray()
     sourceSamplePos = 0
     while True:
         buffer_c += file.read(bufferSize)
-        packetCount = len(buffer_c) // packetSize
-        buffer = buffer_c[:packetCount*packetSize]
-        buffer_c = buffer_c[packetCount*packetSize:]
+        decodedBytes, positions = decodePackets(buffer_c,
+                                                perPacketSampleCount,
+                                                channelCount)
+        del buffer_c[:decodedBytes]
 
-        if packetCount == 0:
+        if decodedBytes == 0:
             break
 
-        # StreamDecoder.Decode(src, 0, packetCount, _perPacketSampleCount, dst);
-        _buffer = (ctypes.c_uint8 * len(buffer))(*buffer)
-        _offsets = (ctypes.c_int64 * 3)()
-        _axis = [
-            (ctypes.c_int64 * (headerParams["perPacketSampleCount"] * PACKET_BUFFER_LEN))(),
-            (ctypes.c_int64 * (headerParams["perPacketSampleCount"] * PACKET_BUFFER_LEN))(),
-            (ctypes.c_int64 * (headerParams["perPacketSampleCount"] * PACKET_BUFFER_LEN))()
-        ]
-        _dest = (ctypes.POINTER(ctypes.c_int64)*3)(*[ctypes.cast(ax, ctypes.POINTER(ctypes.c_int64)) for ax in _axis])
-
-        _DecodePackets(_buffer,
-                       ctypes.c_int(packetCount),
-                       ctypes.c_int(headerParams["perPacketSampleCount"]),
-                       ctypes.c_int(len(headerParams["channelIds"])),
-                       _offsets,
-                       _dest)
-
-        sampleCountInBuffer = packetCount * headerParams["perPacketSampleCount"]
-        srcFreq = headerParams["frequency"]
-        for j in range(sampleCountInBuffer):
-            time = sourceSamplePos / srcFreq
-            elem = [time, None, None, None]
-            for i_src, i_dst in enumerate(headerParams["channelIds"]):
-                elem[i_dst+1] = _axis[i_src][j] - int(headerParams["channels"][i_src+1]["offs"])
-
-            result.append(tuple(elem))
-            sourceSamplePos += 1
+        sampleCountInBuffer = positions.shape[1]
+        positions -= offsets[:, np.newaxis]
+        time = np.arange(sourceSamplePos,
+                         sourceSamplePos + sampleCountInBuffer) / srcFreq
+        columns = [time.tolist(), None, None, None]
+        for i_src, i_dst in enumerate(headerParams["channelIds"]):
+            columns[i_dst+1] = positions[i_src].tolist()
+        for i_dst in range(1, 4):
+            if columns[i_dst] is None:
+                columns[i_dst] = [None] * sampleCountInBuffer
+
+        result.extend(zip(*columns))
+        sourceSamplePos += sampleCountInBuffer
+
+    return result
+
+def parseColumns(file, tStart=None, tStop=None, axes=None,
+                 chunkPacketCount=CHUNK_PACKET_COUNT):
+    """
+    Decode a recorded stream file into one array per axis. The file is
+    memory-mapped and decoded chunk by chunk, only the selected time range
+    and axes are converted.
+
+    Parameters
+    ----------
+    file : file object
+        Stream file opened in binary mode
+    tStart : float, optional
+        Start time in s, from the beginning of the recording
+    tStop : float, optional
+        Stop time in s (excluded)
+    axes : list(int), optional
+        Axes to decode, all the recorded axes by default
+    chunkPacketCount : int
+        Number of packets decoded at once
+
+    Returns
+    -------
+    samples : dict
+        "time": numpy.ndarray of the sample times in s,
+        "axis0", "axis1", "axis2": numpy.ndarray of int64 positions in pm
+        (None if the axis is not recorded or not selected),
+        "header": parameters read in the file header
+    """
+    headerSize, headerParams = parseHeader(file)
+    perPacketSampleCount = headerParams["perPacketSampleCount"]
+    channelCount = len(headerParams["channelIds"])
+    frequency = headerParams["frequency"]
+    dtype = packetDtype(perPacketSampleCount, channelCount)
+
+    file.seek(0, 2)
+    packetCount = (file.tell() - headerSize) // dtype.itemsize
+    firstSample, lastSample = sampleRange(headerParams, packetCount, tStart, tStop)
+
+    result = {"time": np.arange(firstSample, lastSample) / frequency,
+              "axis0": None,
+              "axis1": None,
+              "axis2": None,
+              "header": headerParams}
+    channels = selectChannels(headerParams, axes)
+    for i_src, i_dst in channels:
+        result[f"axis{i_dst}"] = np.empty(lastSample - firstSample, dtype=np.int64)
+    if lastSample == firstSample or not channels:
+        return result
+
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        packets = np.frombuffer(mm, dtype=dtype, count=packetCount,
+                                offset=headerSize)
+        try:
+            for chunkStart, _, chunk in decodeChunks(packets, headerParams,
+                                                      channels, firstSample,
+                                                      lastSample,
+                                                      chunkPacketCount):
+                pos = chunkStart - firstSample
+                for i_src, i_dst in channels:
+                    axis = chunk[i_dst]
+                    result[f"axis{i_dst}"][pos:pos + axis.shape[0]] = axis
+        finally:
+            # The map cannot be closed while a view on it exists
+            del packets
 
     return result
 
+def iterColumns(file, chunkSampleCount=CHUNK_SAMPLE_COUNT, tStart=None,
+                tStop=None, axes=None):
+    """
+    Generator decoding a recorded stream file block by block. The file is
+    memory-mapped and never decoded as a whole, so the memory used does not
+    depend on the file size.
+
+    Parameters
+    ----------
+    file : file object
+        Stream file opened in binary mode
+    chunkSampleCount : int
+        Approximate number of samples per block, rounded to whole packets
+    tStart : float, optional
+        Start time in s, from the beginning of the recording
+    tStop : float, optional
+        Stop time in s (excluded)
+    axes : list(int), optional
+        Axes to decode, all the recorded axes by default
+
+    Yields
+    ------
+    block : dict
+        "startTime": time of the first sample in s from the beginning of
+        the recording, "time": numpy.ndarray of the sample times in s,
+        "axis0", "axis1", "axis2": numpy.ndarray of int64 positions in pm
+        (None if the axis is not recorded or not selected),
+        "header": parameters read in the file header
+    """
+    headerSize, headerParams = parseHeader(file)
+    perPacketSampleCount = headerParams["perPacketSampleCount"]
+    frequency = headerParams["frequency"]
+    dtype = packetDtype(perPacketSampleCount, len(headerParams["channelIds"]))
+
+    file.seek(0, 2)
+    packetCount = (file.tell() - headerSize) // dtype.itemsize
+    firstSample, lastSample = sampleRange(headerParams, packetCount, tStart, tStop)
+    channels = selectChannels(headerParams, axes)
+    if lastSample == firstSample:
+        return
+
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        packets = np.frombuffer(mm, dtype=dtype, count=packetCount,
+                                offset=headerSize)
+        try:
+            for chunkStart, chunkStop, chunk in decodeChunks(packets, headerParams,
+                                                              channels, firstSample,
+                                                              lastSample,
+                                                              max(1, chunkSampleCount // perPacketSampleCount)):
+                block = {"startTime": chunkStart / frequency,
+                         "time": np.arange(chunkStart, chunkStop) / frequency,
+                         "axis0": None,
+                         "axis1": None,
+                         "axis2": None,
+                         "header": headerParams}
+                for i_dst, axis in chunk.items():
+                    block[f"axis{i_dst}"] = axis
+                yield block
+        finally:
+            del packets
+
+def sampleRange(headerParams, packetCount, tStart=None, tStop=None):
+    """
+    First and last (excluded) sample indexes of the time range [tStart, tStop[
+    """
+    frequency = headerParams["frequency"]
+    sampleCount = packetCount * headerParams["perPacketSampleCount"]
+    firstSample = 0 if tStart is None else max(0, math.ceil(tStart * frequency))
+    lastSample = sampleCount if tStop is None \
+        else min(sampleCount, math.ceil(tStop * frequency))
+    return firstSample, max(firstSample, lastSample)
+
+def selectChannels(headerParams, axes=None):
+    """
+    List of (index in the packets, axis number) of the recorded channels,
+    restricted to the given axes.
+    """
+    return [(i_src, i_dst) for i_src, i_dst in enumerate(headerParams["channelIds"])
+            if axes is None or i_dst in axes]
+
+def decodeChunks(packets, headerParams, channels, firstSample, lastSample,
+                 chunkPacketCount=CHUNK_PACKET_COUNT):
+    """
+    Generator decoding mapped packets chunk by chunk.
+
+    Yields
+    ------
+    chunkStart : int
+        Index of the first sample of the chunk
+    chunkStop : int
+        Index of the sample following the chunk
+    chunk : dict
+        int64 positions in pm, corrected by the channel offset, for each
+        selected axis number
+    """
+    perPacketSampleCount = headerParams["perPacketSampleCount"]
+    offsets = {i_src: int(headerParams["channels"][i_src+1]["offs"])
+               for i_src, _ in channels}
+    firstPacket = firstSample // perPacketSampleCount
+    lastPacket = -(-lastSample // perPacketSampleCount)
+
+    for packet in range(firstPacket, lastPacket, chunkPacketCount):
+        chunkPackets = packets[packet:min(packet + chunkPacketCount, lastPacket)]
+        chunkFirstSample = packet * perPacketSampleCount
+        # Samples of the chunk inside [firstSample, lastSample[
+        start = max(firstSample - chunkFirstSample, 0)
+        stop = min(lastSample - chunkFirstSample,
+                   chunkPackets.shape[0] * perPacketSampleCount)
+        chunk = {}
+        for i_src, i_dst in channels:
+            axis = decodeChannel(chunkPackets, i_src,
+                                 np.empty(chunkPackets.shape[0] * perPacketSampleCount,
+                                          dtype=np.int64))
+            axis -= offsets[i_src]
+            chunk[i_dst] = axis[start:stop]
+        yield chunkFirstSample + start, chunkFirstSample + stop, chunk
+
 def fileWriter(deviceAddress,
                isMaster,
                intervalInMicroseconds,
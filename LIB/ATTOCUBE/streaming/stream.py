@@ -1,12 +1,18 @@
 import ctypes
 
-from .dll_wrapper import _GetLastStreamError, \
+import numpy as np
+
+from .dll_wrapper import NATIVE_AVAILABLE, \
+                         _GetLastStreamError, \
                          _OpenStream, \
                          _CloseStream, \
                          _ReadStream, \
                          _DecodeStreamSingle, \
                          _StartStreamRecording, \
                          _StopStreamRecording
+from .decoder import decodePackets, \
+                     samplesPerPacket
+
 class Stream():
     def __init__(self, deviceAddress, isMaster, intervalInMicroseconds, filePath=None, axis0=False, axis1=False, axis2=False):
         """
@@ -38,6 +44,9 @@ class Stream():
         self.filePath = filePath
 
         self.recording = False
+        # Bytes of an incomplete packet kept at the start of the raw buffer
+        # between two calls of readInto
+        self.pendingBytes = 0
 
         self.channelMask = 0
         if axis0:
@@ -47,6 +56,11 @@ class Stream():
         if axis2:
             self.channelMask |= 4
 
+        self.channelIds = [i for i in range(3) if self.channelMask & (1 << i)]
+        self.perPacketSampleCount = samplesPerPacket(intervalInMicroseconds)
+        # Decode with the native library if available
+        self.native = NATIVE_AVAILABLE
+
     def __del__(self):
         if self.connected and self.handle != 0:
             self.close()
@@ -137,13 +151,16 @@ class Stream():
         axis2 : list
             List containing positions of axis 2 in pm
         """
+        if not self.native:
+            return self._decodeBufferNumpy(buffer)
+
         axis0 = (ctypes.c_int64 * len(buffer))()
         axis1 = (ctypes.c_int64 * len(buffer))()
         axis2 = (ctypes.c_int64 * len(buffer))()
         decodedSampleCount = (ctypes.c_int * 1)()
 
         decodedBytes = _DecodeStreamSingle(ctypes.c_void_p(self.handle),
-                                          (ctypes.c_uint8 * len(buffer))(*buffer),
+                                          (ctypes.c_uint8 * len(buffer)).from_buffer_copy(buffer),
                                           ctypes.c_int(len(buffer)),
                                           axis0,
                                           axis1,
@@ -175,6 +192,28 @@ class Stream():
 
         return decodedBytes, axis0, axis1, axis2
 
+    def _decodeBufferNumpy(self, buffer):
+        """
+        Decode raw position data buffer without the native library.
+        Same results as decodeBuffer, the axes being numpy arrays.
+        """
+        decodedBytes, positions = decodePackets(buffer,
+                                                self.perPacketSampleCount,
+                                                len(self.channelIds))
+        if positions.shape[1] == 0:
+            print("No samples received.")
+            print("Possible causes:")
+            print("\t- Measurement is not running on all selected axes")
+            print("\t- Error on at least one of your selected axes")
+            print("\t- Buffer too small")
+
+        # Axes not streamed: empty arrays of the same dtype
+        axes = [np.empty(0, dtype=positions.dtype) for _ in range(3)]
+        for i_src, i_dst in enumerate(self.channelIds):
+            axes[i_dst] = positions[i_src]
+
+        return decodedBytes, axes[0], axes[1], axes[2]
+
     def read(self, bufferSize):
         """
         Read and decode position data in buffer.
@@ -198,6 +237,143 @@ class Stream():
         buffer = self.readRaw(bufferSize)
         return self.decodeBuffer(buffer)
 
+    def allocateBuffers(self, bufferSize):
+        """
+        Allocate the buffers used by readInto. They are meant to be created
+        once and reused for every read.
+
+        Parameters
+        ----------
+        bufferSize : int
+            Size of the raw buffer in Bytes
+
+        Returns
+        -------
+        raw : numpy.ndarray
+            uint8 array receiving the raw position data
+        positions : numpy.ndarray
+            int64 array of shape (3, N) receiving the decoded positions
+        """
+        # Every sample takes at least 4 Bytes in the raw data
+        sampleCount = bufferSize // 4 + self.perPacketSampleCount
+        self.pendingBytes = 0
+        return np.empty(bufferSize, dtype=np.uint8), \
+               np.empty((3, sampleCount), dtype=np.int64)
+
+    def readRawInto(self, raw, offset=0):
+        """
+        Read raw position data into a caller-provided buffer, without
+        allocating.
+
+        Parameters
+        ----------
+        raw : numpy.ndarray
+            Contiguous uint8 array
+        offset : int, default: 0
+            Position in raw where the data is written
+
+        Returns
+        -------
+        length : int
+            Number of Bytes read
+        """
+        if not self.connected or self.handle == 0:
+            raise Exception("Stream not connected")
+
+        free = raw.shape[0] - offset
+        if free <= 0:
+            return 0
+        return _ReadStream(ctypes.c_void_p(self.handle),
+                           np.ctypeslib.as_ctypes(raw[offset:]),
+                           ctypes.c_int(free))
+
+    def decodeBufferInto(self, buffer, positions):
+        """
+        Decode raw position data to positions in pm, into a caller-provided
+        array.
+
+        Parameters
+        ----------
+        buffer : numpy.ndarray
+            Contiguous uint8 array of raw position data
+        positions : numpy.ndarray
+            Contiguous int64 array of shape (3, N), see allocateBuffers
+
+        Returns
+        -------
+        decodedBytes : int
+            Number of decoded Bytes
+        axis0 : numpy.ndarray
+            Positions of axis 0 in pm, view on positions (empty if the axis is
+            not streamed)
+        axis1 : numpy.ndarray
+            Positions of axis 1 in pm, view on positions
+        axis2 : numpy.ndarray
+            Positions of axis 2 in pm, view on positions
+        """
+        channelCount = len(self.channelIds)
+        if self.native:
+            decodedSampleCount = (ctypes.c_int * 1)()
+            dest = [positions[i].ctypes.data_as(ctypes.POINTER(ctypes.c_int64))
+                    for i in range(3)]
+            decodedBytes = _DecodeStreamSingle(ctypes.c_void_p(self.handle),
+                                               buffer.ctypes.data_as(ctypes.POINTER(ctypes.c_uint8)),
+                                               ctypes.c_int(buffer.shape[0]),
+                                               dest[0],
+                                               dest[1],
+                                               dest[2],
+                                               ctypes.c_int(positions.nbytes),
+                                               decodedSampleCount)
+            decodedSamples = decodedSampleCount[0]
+        else:
+            decodedBytes, decoded = decodePackets(buffer,
+                                                  self.perPacketSampleCount,
+                                                  channelCount,
+                                                  out=positions[:channelCount])
+            decodedSamples = decoded.shape[1]
+
+        axes = [positions[i, :0] for i in range(3)]
+        for i_src, i_dst in enumerate(self.channelIds):
+            axes[i_dst] = positions[i_src, :decodedSamples]
+
+        return decodedBytes, axes[0], axes[1], axes[2]
+
+    def readInto(self, raw, positions):
+        """
+        Read and decode position data using caller-provided buffers.
+        Bytes of an incomplete packet are kept for the next call, so no
+        sample is lost between two reads.
+
+        The returned axes are views on positions: they are overwritten by the
+        next call and must be copied if they are kept.
+
+        Parameters
+        ----------
+        raw : numpy.ndarray
+            uint8 array, see allocateBuffers
+        positions : numpy.ndarray
+            int64 array of shape (3, N), see allocateBuffers
+
+        Returns
+        -------
+        decodedBytes : int
+            Number of decoded Bytes
+        axis0 : numpy.ndarray
+            Positions of axis 0 in pm
+        axis1 : numpy.ndarray
+            Positions of axis 1 in pm
+        axis2 : numpy.ndarray
+            Positions of axis 2 in pm
+        """
+        length = self.pendingBytes + self.readRawInto(raw, self.pendingBytes)
+        result = self.decodeBufferInto(raw[:length], positions)
+
+        decodedBytes = result[0]
+        self.pendingBytes = length - decodedBytes
+        if self.pendingBytes:
+            raw[:self.pendingBytes] = raw[decodedBytes:length]
+        return result
+
     def startRecording(self, filePath):
         """
         Starts stream recording to file
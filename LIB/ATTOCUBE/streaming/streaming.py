@@ -2,7 +2,10 @@ from multiprocessing import Process, \
                             Value, \
                             Barrier
 
-from .file_parser import parse, \
+from .file_parser import CHUNK_SAMPLE_COUNT, \
+                         iterColumns, \
+                         parse, \
+                         parseColumns, \
                          fileWriter
 
 from .stream import Stream
@@ -46,7 +49,7 @@ class Streaming():
                       axis1,
                       axis2)
 
-    def loadFile(self, filePath):
+    def loadFile(self, filePath, columnar=False, tStart=None, tStop=None, axes=None):
         """
         Load content of recorded stream file
 
@@ -54,17 +57,61 @@ class Streaming():
         ----------
         filePath : str
             Path to file
-
+        columnar : bool, default: False
+            If True, return one array per axis instead of a list of samples.
+            The file is memory-mapped and decoded chunk by chunk.
+        tStart : float, optional
+            Columnar only: start time in s from the beginning of the recording
+        tStop : float, optional
+            Columnar only: stop time in s (excluded)
+        axes : list(int), optional
+            Columnar only: axes to load, all the recorded axes by default
 
         Returns
         -------
         samples : list(tuple(float, float, float, float))
             A list containing all samples as tuples in the following format:
             (time, axis0, axis1, axis2)
+        samples : dict
+            If columnar, a dict with the keys "time" (numpy.ndarray in s),
+            "axis0", "axis1", "axis2" (numpy.ndarray of int64 positions in pm,
+            None if not loaded) and "header" (parameters of the file header)
         """
         with open(filePath, "rb") as file:
+            if columnar:
+                return parseColumns(file, tStart, tStop, axes)
             return parse(file)
 
+    def iterFile(self, filePath, chunkSampleCount=CHUNK_SAMPLE_COUNT, tStart=None, tStop=None, axes=None):
+        """
+        Iterate over a recorded stream file block by block, without loading
+        the whole file
+
+        Parameters
+        ----------
+        filePath : str
+            Path to file
+        chunkSampleCount : int
+            Approximate number of samples per block (rounded to whole packets)
+        tStart : float, optional
+            Start time in s from the beginning of the recording
+        tStop : float, optional
+            Stop time in s (excluded)
+        axes : list(int), optional
+            Axes to load, all the recorded axes by default
+
+        Returns
+        -------
+        blocks : generator(dict)
+            Dicts with the keys "startTime" (time of the first sample in s),
+            "time" (numpy.ndarray in s), "axis0", "axis1", "axis2"
+            (numpy.ndarray of int64 positions in pm, None if not loaded) and
+            "header" (parameters of the file header, "recorded" giving the
+            absolute start date)
+        """
+        with open(filePath, "rb") as file:
+            yield from iterColumns(file, chunkSampleCount, tStart, tStop, axes)
+
     def startBackgroundStreaming(self, isMaster, intervalInMicroseconds, filePath, bufferSize=2<<20, axis0=False, axis1=False, axis2=False):
         """
         Starts concurrent and permanent position streaming to file in background
@@ -29,10 +29,21 @@ except ModuleNotFoundError:
     print("Please install it by typing 'conda install pyusb' in a Terminal.")
 
 import re
+import threading
+import time
 import logging
 
 
-NEWFOCUS_COMMAND_REGEX = re.compile("([0-9]{0,1})([a-zA-Z?]{2,})([0-9+-]*)")
+NEWFOCUS_COMMAND_REGEX = re.compile("(?:([0-9]{1,2})>)?([0-9]{0,1})([a-zA-Z?]{2,})([0-9+-]*)")
+# Polling of the motion done status (s)
+MOTION_DONE_FIRST_POLL = 0.002
+MOTION_DONE_MAX_POLL = 0.1
+# Size of the USB transfers: longest batch of commands sent at once
+USB_PACKET_SIZE = 64
+# Addresses of the controllers of an RS-485 daisy chain and time allowed to
+# the scan of the chain (s)
+CONTROLLER_ADDRESSES = range(1, 32)
+SCAN_TIMEOUT = 5.
 MOTOR_TYPE = {
         "0":"No motor connected",
         "1":"Motor Unknown",
@@ -41,7 +52,8 @@ MOTOR_TYPE = {
         }
 
 class Pico8742Ctrl(object):
-    def __init__(self, idProduct, idVendor):
+    def __init__(self, idProduct, idVendor, transport=None, device=None,
+                 address=1, master=None):
         """
         Initialize the Picomotor class with the spec's of the attached device
         
@@ -50,10 +62,32 @@ class Pico8742Ctrl(object):
         INPUT:
             idProduct (hex): Product ID of picomotor controller
             idVendor (hex): Vendor ID of picomotor controller
+            transport : Object with the write(usb_command) and read(size)
+                        methods of the USB endpoints, used instead of the USB
+                        device (e.g. pico8742sim.Pico8742Simulator)
+            device : USB device to use, when several controllers have the
+                     same Vendor ID and Product ID (first one found by default)
+            address (int): RS-485 address of the controller
+            master (Pico8742Ctrl): Controller connected to the USB, for a
+                     controller reached through its RS-485 daisy chain
         """
         self.channel = None
+        # Motor type of each port
+        self.motor_types = {}
         self.idProduct = idProduct
         self.idVendor = idVendor
+        self.transport = transport
+        self.dev = device
+        self.address = address
+        self.master = master
+        # NewFocus command -> (USB command, reply expected)
+        self.command_cache = {}
+        # One transfer (command and its reply) at a time on the endpoints
+        self.io_lock = threading.RLock()
+        # time.perf_counter_ns before the write and after the reply (or the
+        # write) of the last transfer
+        self.issued_ns = None
+        self.completed_ns = None
         self.message = self.usbconnect()
         self.status  = 0
         #self.ep_out = None
@@ -70,12 +104,23 @@ class Pico8742Ctrl(object):
                 ID
             Assert False: if the input and outgoing endpoints can't be established
         """
+        if self.master is not None:
+            # Commands relayed by the master: same endpoints, same transfers
+            self.ep_out, self.ep_in = self.master.ep_out, self.master.ep_in
+            self.io_lock = self.master.io_lock
+            return self.identify()
+
+        if self.transport is not None:
+            self.ep_out = self.ep_in = self.transport
+            return self.identify()
+
         # find the device
         try: 
-            self.dev = usb.core.find(
-                            idProduct=self.idProduct,
-                            idVendor=self.idVendor
-                            )
+            if self.dev is None:
+                self.dev = usb.core.find(
+                                idProduct=self.idProduct,
+                                idVendor=self.idVendor
+                                )
            
             if self.dev is not None:
                 #raise ValueError('Device not found')
@@ -105,24 +150,7 @@ class Pico8742Ctrl(object):
                         usb.util.ENDPOINT_IN)
 
                 if  self.ep_out is not None and self.ep_in is not None:
-                    # Confirm connection to user
-                    resp = self.command('VE?')
-                    outmessage = "Connected to Motor Controller Model {}. Firmware {} {} {}\n".format(
-                                                                *resp.split(' '))
-                    logging.info(f"{outmessage}")
-                    for m in range(1,5):
-                        resp = self.command("{}QM?".format(m))
-
-                        #print(f"Port {m} - status {resp}")
-                        #print("Motor #{motor_number}: {status}".format(
-                        #                                        motor_number=m,
-                        #                                        status=MOTOR_TYPE[resp[-1]]))
-                        if resp[-1] == "3":
-                            self.channel = m
-                            outmessage += f"Default motor found on port {m}\n"
-                            logging.info(f"{outmessage}")
-                    self.status = 1
-                    return outmessage
+                    return self.identify()
                 else:
                     return "ERROR: Device not found"
             else:
@@ -130,8 +158,42 @@ class Pico8742Ctrl(object):
         except usb.core.USBError:
             return "WARNING: Motor already connected"
 
+    def identify(self):
+        """
+        Read the controller version and look for the motors once the
+        endpoints are set
+        ----
+        RETURN:
+            Connection message
+        """
+        # Confirm connection to user, version and motor types in one transfer
+        replies = self.command_batch(['VE?'] + ["{}QM?".format(m) for m in range(1,5)])
+        resp = replies[0]
+        outmessage = "Connected to Motor Controller Model {}. Firmware {} {} {}\n".format(
+                                                    *resp.split(' '))
+        logging.info(f"{outmessage}")
+        for m in range(1,5):
+            resp = replies[m]
+            self.motor_types[m] = resp[-1]
+
+            #print(f"Port {m} - status {resp}")
+            #print("Motor #{motor_number}: {status}".format(
+            #                                        motor_number=m,
+            #                                        status=MOTOR_TYPE[resp[-1]]))
+            if resp[-1] == "3":
+                self.channel = m
+                outmessage += f"Default motor found on port {m}\n"
+                logging.info(f"{outmessage}")
+        self.status = 1
+        return outmessage
+
     def close(self):
-        usb.util.dispose_resources(self.dev)
+        if self.master is not None:
+            return
+        if self.transport is not None:
+            self.transport.close()
+        else:
+            usb.util.dispose_resources(self.dev)
 
     def send_command(self, usb_command, get_reply=False):
         """
@@ -146,17 +208,24 @@ class Pico8742Ctrl(object):
             Character representation of returned hex values if a reply is
                 requested
         """
-        self.ep_out.write(usb_command)
+        reply = None
+        with self.io_lock:
+            self.issued_ns = time.perf_counter_ns()
+            self.ep_out.write(usb_command)
 
-        if get_reply:
-            return self.ep_in.read(100)
+            if get_reply:
+                reply = self.ep_in.read(100)
+            self.completed_ns = time.perf_counter_ns()
+        return reply
 
     def parse_command(self, newfocuscmd):
         """
         Convert a NewFocus style command into a USB command
         ------
         INPUT:
-            newfocuscmd (str): of the form xxAAnn
+            newfocuscmd (str): of the form [a>]xxAAnn
+                a> is the address of the controller (RS-485 chain), this
+                   controller by default
                 xx> it the device number
                 AA> the command
                 nn> a parameter
@@ -171,16 +240,23 @@ class Pico8742Ctrl(object):
         # Check to see if a regex match was found in the user submitted command
         if parsed_cmd:
             # Extract matched components of the command
-            driver_number, command, parameter = parsed_cmd.groups()
-            
+            address, driver_number, command, parameter = parsed_cmd.groups()
+
             usb_command = command
 
             # Construct USB safe command
             if driver_number:
-                usb_command = '1>{driver_number} {command}'.format(
+                usb_command = '{driver_number} {command}'.format(
                                                     driver_number=driver_number,
                                                     command=usb_command
                                                     )
+            # The commands of the motors and of the controllers of the chain
+            # start with the address of their controller
+            if address is None and (driver_number or self.master is not None):
+                address = self.address
+            if address is not None:
+                usb_command = '{address}>{command}'.format(address=address,
+                                                           command=usb_command)
             if parameter:
                 usb_command = '{command} {parameter}'.format(
                                                     command=usb_command,
@@ -195,6 +271,26 @@ class Pico8742Ctrl(object):
                                                             newfocuscmd))
 
 
+    def compile_command(self, newfocuscmd):
+        """
+        Convert a NewFocus style command into a USB command, once: the
+        result is kept in self.command_cache for the commands repeated by
+        the cycles (e.g. 1PR+100)
+        ----
+        INPUT
+            newfocuscmd (str): NewFocus command
+        ----
+        RETURN
+            (usb_command, get_reply): USB command (None if not valid) and
+                True if the controller replies to it
+        """
+        compiled = self.command_cache.get(newfocuscmd)
+        if compiled is None:
+            compiled = (self.parse_command(newfocuscmd), '?' in newfocuscmd)
+            if compiled[0] is not None:
+                self.command_cache[newfocuscmd] = compiled
+        return compiled
+
     def parse_reply(self, reply):
         """
         Retrieve the controller's answer and make it readable
@@ -223,14 +319,9 @@ class Pico8742Ctrl(object):
             reply (str): Human readable reply from controller
         """
         # print(f"In pico8742: {newfocuscmd}")
-        usb_command = self.parse_command(newfocuscmd)
-
-        # if there is a '?' in the command, the user expects a response from
-        # the driver
-        if '?' in newfocuscmd:
-            get_reply = True
-        else:
-            get_reply = False
+        # get_reply: if there is a '?' in the command, the user expects a
+        # response from the driver
+        usb_command, get_reply = self.compile_command(newfocuscmd)
 
         reply = self.send_command(usb_command, get_reply)
 
@@ -238,6 +329,78 @@ class Pico8742Ctrl(object):
         if get_reply:
             return self.parse_reply(reply)
 
+    def command_batch(self, newfocuscmds):
+        """
+        Send several NewFocus formated commands in as few USB transfers as
+        possible: the commands are separated by ';' (compound commands of
+        the 8742) up to USB_PACKET_SIZE characters per transfer.
+        ----
+        INPUT
+            newfocuscmds (list of str): Legal commands listed in usermanual
+        ----
+        RETURN
+            replies (list): Human readable reply of each query, None for the
+                commands without reply
+        """
+        compiled = [self.compile_command(cmd) for cmd in newfocuscmds]
+        replies = [None] * len(compiled)
+        batch = []
+        length = 0
+        for i, (usb_command, get_reply) in enumerate(compiled):
+            if usb_command is None:
+                continue
+            usb_command = usb_command.rstrip('\r')
+            if batch and length + len(usb_command) + 1 > USB_PACKET_SIZE:
+                self.send_batch(batch, compiled, replies)
+                batch = []
+                length = 0
+            batch.append(i)
+            length += len(usb_command) + 1
+        if batch:
+            self.send_batch(batch, compiled, replies)
+        return replies
+
+    def send_batch(self, indexes, compiled, replies):
+        """
+        Send the compiled commands of the indexes as one compound command
+        and dispatch the reply lines to the queries, in order
+        """
+        queries = [i for i in indexes if compiled[i][1]]
+        lines = []
+        pending = ''
+        with self.io_lock:
+            self.issued_ns = time.perf_counter_ns()
+            self.ep_out.write(';'.join(compiled[i][0].rstrip('\r') for i in indexes) + '\r')
+            while len(lines) < len(queries):
+                # The replies come in one or several transfers, each one ends
+                # with \r\n
+                pending += ''.join([chr(x) for x in self.ep_in.read(100)])
+                *complete, pending = pending.split('\r\n')
+                lines += complete
+            self.completed_ns = time.perf_counter_ns()
+        for i, line in zip(queries, lines):
+            replies[i] = line.rstrip()
+
+    def scan_addresses(self, timeout=SCAN_TIMEOUT):
+        """
+        Scan the RS-485 daisy chain of the controller (SC, SD?, SC?)
+        ----
+        RETURN
+            List of the addresses of the controllers found, this one included
+        """
+        self.command("SC0")
+        start = time.monotonic()
+        while self.command("SD?")[-1:] != "1":
+            if time.monotonic() - start > timeout:
+                raise Exception(f"Scan of the RS-485 chain not done after {timeout} s")
+            time.sleep(MOTION_DONE_MAX_POLL)
+        reply = self.command("SC?")
+        # Bit n is set if a controller has the address n, bit 0 on conflict
+        found = int(reply[reply.find(">") + 1:])
+        if found & 1:
+            logging.warning("MOTOR: address conflict on the RS-485 chain")
+        return [address for address in CONTROLLER_ADDRESSES if found >> address & 1]
+
     def get_velocity(self, channel="1"):
         """
             Returns velocity for a given channel
@@ -305,6 +468,46 @@ class Pico8742Ctrl(object):
         cmd = channel+"TP?"
         return self.command(cmd)
 
+    def is_motion_done(self, channel=None):
+        """
+        Returns True if the motor of the channel is not moving (MD?)
+        """
+        if channel is None:
+            channel = str(self.channel)
+        reply = self.command(f"{channel}MD?")
+        return reply is not None and reply[-1:] == "1"
+
+    def wait_motion_done(self, channel=None, timeout=None, abort=None,
+                         clock=time.time):
+        """
+        Wait until the motor of the channel has stopped, polling MD? with an
+        interval doubling from MOTION_DONE_FIRST_POLL to MOTION_DONE_MAX_POLL:
+        short moves are detected quickly, long ones don't flood the USB.
+        (The 8742 has no interrupt endpoint reporting the end of a move.)
+        ----
+        INPUT
+            @channel (int): Channel number
+            @timeout (float): Maximum waiting time in s (None: no limit)
+            @abort (function): Stop waiting when it returns True (e.g. stop
+                               requested by the user)
+            @clock (function): Clock of the returned timestamp
+        ----
+        RETURN
+            Timestamp (clock()) at which the motion was seen done, None on
+            timeout or abort
+        """
+        start = time.monotonic()
+        delay = MOTION_DONE_FIRST_POLL
+        while not self.is_motion_done(channel):
+            if abort is not None and abort():
+                return None
+            if timeout is not None and time.monotonic() - start + delay > timeout:
+                logging.warning(f"MOTOR: motion not done after {timeout} s")
+                return None
+            time.sleep(delay)
+            delay = min(2 * delay, MOTION_DONE_MAX_POLL)
+        return clock()
+
     def start_console(self):
         """Continuously ask user for a command
         """
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Several Newport Picomotor 8742 controllers with up to four motors each.
+
+Every controller found on the USB bus is opened once, with the controllers
+of its RS-485 daisy chain, and gets its own command queue, executed by a
+dedicated thread: the commands of a controller are sent one after the other
+while the controllers work concurrently (the controllers of one chain share
+its USB transfers). An axis is identified by (controller index, port):
+
+    manager = Pico8742Manager(idProduct=0x4000, idVendor=0x104d)
+    manager.move_and_wait({(0, 1): 100, (1, 3): -250})
+    manager.close()
+
+"""
+
+import concurrent.futures
+import logging
+import queue
+import threading
+
+try:
+    import usb
+except ModuleNotFoundError:
+    print("Module 'usb' is not installed")
+    print("Please install it by typing 'conda install pyusb' in a Terminal.")
+
+from LIB.MOTOR.pico8742ctrl import Pico8742Ctrl
+
+
+class Pico8742Manager(object):
+    def __init__(self, idProduct=None, idVendor=None, transports=None,
+                 scan_chain=True):
+        """
+        Open all the controllers with the Vendor ID and Product ID
+        ----
+        INPUT:
+            idProduct (hex): Product ID of picomotor controllers
+            idVendor (hex): Vendor ID of picomotor controllers
+            transports (list): Transports used instead of the USB devices, one
+                               controller per transport (see Pico8742Ctrl)
+            scan_chain (bool): Look for the controllers of the RS-485 daisy
+                               chain of each USB controller
+        """
+        if transports is not None:
+            self.controllers = [Pico8742Ctrl(idProduct, idVendor, transport=transport)
+                                for transport in transports]
+        else:
+            self.controllers = [Pico8742Ctrl(idProduct, idVendor, device=device)
+                                for device in self.find_devices(idProduct, idVendor)]
+        self.controllers = [controller for controller in self.controllers
+                            if controller.motor_types]
+        if scan_chain:
+            self.controllers = [chained for controller in self.controllers
+                                for chained in self.chain(controller)]
+        logging.info(f"MOTOR: {len(self.controllers)} controller(s) found")
+
+        # Incremented by stop_all: the moves queued or waited under an older
+        # generation are abandoned
+        self.stop_generation = 0
+        self.stop_lock = threading.Lock()
+        self.queues = []
+        self.workers = []
+        for index in range(len(self.controllers)):
+            commands = queue.Queue()
+            worker = threading.Thread(target=self.run_queue, args=(commands,),
+                                      name=f"Pico8742-{index}", daemon=True)
+            worker.start()
+            self.queues.append(commands)
+            self.workers.append(worker)
+
+    @staticmethod
+    def find_devices(idProduct, idVendor):
+        """
+        Returns the list of USB devices with the Vendor ID and Product ID
+        """
+        return list(usb.core.find(find_all=True,
+                                  idProduct=idProduct,
+                                  idVendor=idVendor))
+
+    @staticmethod
+    def chain(controller):
+        """
+        Returns the controller followed by the other controllers of its
+        RS-485 daisy chain
+        """
+        try:
+            addresses = controller.scan_addresses()
+        except Exception as e:
+            logging.warning(f"MOTOR: scan of the RS-485 chain failed: {e}")
+            return [controller]
+        return [controller] + [Pico8742Ctrl(controller.idProduct, controller.idVendor,
+                                            address=address, master=controller)
+                               for address in addresses if address != controller.address]
+
+    def axes(self, motor_types=("2", "3")):
+        """
+        Returns the list of (controller index, port) of the connected motors
+        ----
+        INPUT
+            @motor_types (tuple): Motor types of the axes (see MOTOR_TYPE)
+        """
+        return [(index, port)
+                for index, controller in enumerate(self.controllers)
+                for port, motor_type in sorted(controller.motor_types.items())
+                if motor_type in motor_types]
+
+    @staticmethod
+    def run_queue(commands):
+        """
+        Execute the functions of a controller queue until None is received
+        """
+        while True:
+            job = commands.get()
+            if job is None:
+                break
+            future, function, args = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+    def submit(self, index, function, *args):
+        """
+        Queue function(controller, *args) for the controller of the index
+        ----
+        RETURN
+            concurrent.futures.Future of the result of the function
+        """
+        future = concurrent.futures.Future()
+        self.queues[index].put((future, function, (self.controllers[index],) + args))
+        return future
+
+    def command(self, index, newfocuscmd):
+        """
+        Queue a NewFocus command for the controller of the index
+        ----
+        RETURN
+            concurrent.futures.Future of the reply
+        """
+        return self.submit(index, Pico8742Ctrl.command, newfocuscmd)
+
+    def group_by_controller(self, moves):
+        """
+        Returns {controller index: {port: steps}} from {(index, port): steps}
+        """
+        grouped = {}
+        for (index, port), steps in moves.items():
+            grouped.setdefault(index, {})[port] = steps
+        return grouped
+
+    def run_moves(self, controller, moves, command, wait, generation):
+        """
+        Start the moves of the ports of one controller in one transfer and
+        wait for the end of each of them, unless stop_all was called since
+        the moves were requested (generation)
+        ----
+        RETURN
+            {port: timestamp of the end of the move (None if aborted)}
+        """
+        def stopped():
+            return self.stop_generation != generation
+
+        if stopped():
+            return dict.fromkeys(moves)
+        controller.command_batch([f"{port}{command}{steps:+d}"
+                                  for port, steps in moves.items()])
+        if not wait:
+            return dict.fromkeys(moves)
+        done = dict((port, controller.wait_motion_done(port, abort=stopped))
+                    for port in moves)
+        if stopped():
+            # The motors may have stopped on ST before the end of the move
+            return dict.fromkeys(moves)
+        return done
+
+    def move(self, moves, relative=True, wait=True):
+        """
+        Start moves on several axes: the controllers move concurrently, the
+        axes of one controller start together.
+        ----
+        INPUT
+            @moves (dict): {(controller index, port): steps (or position if
+                           not relative)}
+            @relative (bool): Relative (PR) or absolute (PA) moves
+            @wait (bool): Wait for the end of the moves before executing the
+                          next commands of the controllers
+        ----
+        RETURN
+            {controller index: Future of {port: end of move timestamp}}
+        """
+        command = "PR" if relative else "PA"
+        generation = self.stop_generation
+        return dict((index, self.submit(index, self.run_moves, ports, command, wait,
+                                        generation))
+                    for index, ports in self.group_by_controller(moves).items())
+
+    def move_and_wait(self, moves, relative=True, timeout=None):
+        """
+        Coordinated move: start the moves on all the axes and wait for all of
+        them to be finished
+        ----
+        RETURN
+            {(controller index, port): end of move timestamp}
+        """
+        futures = self.move(moves, relative)
+        done = {}
+        for index, future in futures.items():
+            for port, timestamp in future.result(timeout).items():
+                done[(index, port)] = timestamp
+        return done
+
+    def get_positions(self, axes=None):
+        """
+        Returns {(controller index, port): position} of the axes (all by
+        default), read concurrently on the controllers
+        """
+        if axes is None:
+            axes = self.axes()
+        grouped = self.group_by_controller(dict.fromkeys(axes))
+        futures = dict((index, self.submit(index, Pico8742Ctrl.command_batch,
+                                           [f"{port}TP?" for port in ports]))
+                       for index, ports in grouped.items())
+        positions = {}
+        for index, future in futures.items():
+            for port, reply in zip(grouped[index], future.result()):
+                positions[(index, port)] = int(reply[reply.find(">") + 1:])
+        return positions
+
+    def stop_all(self):
+        """
+        Stop the motion of all the motors: the commands still queued are
+        cancelled, the moves being waited are abandoned and ST is sent to
+        every controller right away, without waiting for its queue
+        ----
+        RETURN
+            Number of cancelled commands
+        """
+        with self.stop_lock:
+            self.stop_generation += 1
+        cancelled = 0
+        for commands in self.queues:
+            closing = False
+            while True:
+                try:
+                    job = commands.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    closing = True
+                elif job[0].cancel():
+                    cancelled += 1
+            if closing:
+                commands.put(None)
+        for controller in self.controllers:
+            # Only waits for the USB transfer in progress, if any
+            controller.command("ST")
+        logging.info(f"MOTOR: stop, {cancelled} queued command(s) cancelled")
+        return cancelled
+
+    def close(self):
+        for commands in self.queues:
+            commands.put(None)
+        for worker in self.workers:
+            worker.join()
+        for controller in self.controllers:
+            controller.close()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Simulated Newport Picomotor 8742 controller, used as the transport of
+Pico8742Ctrl instead of the USB endpoints:
+
+    controller = Pico8742Ctrl(idProduct, idVendor,
+                              transport=Pico8742Simulator())
+
+Load test of the command throughput, from the root of the project:
+
+$ python -m LIB.MOTOR.pico8742sim --cycles 10000
+
+"""
+
+import argparse
+import collections
+import re
+import threading
+import time
+
+from LIB.MOTOR.pico8742ctrl import Pico8742Ctrl
+
+# [controller address>][axis] command [parameter]
+USB_COMMAND_REGEX = re.compile(
+    r"^\s*(?:(\d+)>)?\s*(\d?)\s*([A-Za-z*]{2,}\??)\s*([0-9+-]*)\s*$")
+
+ERROR_MESSAGES = {
+    0: "NO ERROR DETECTED",
+    6: "COMMAND DOES NOT EXIST",
+    7: "PARAMETER OUT OF RANGE",
+    10: "MOTION QUEUE FULL",
+}
+
+
+class SimulatedAxis(object):
+    """
+    Motion of one motor: the relative moves are queued and executed one
+    after the other with a trapezoidal velocity profile.
+    """
+    def __init__(self, motor_type="3", velocity=2000, acceleration=100000):
+        self.motor_type = motor_type
+        self.velocity = velocity
+        self.acceleration = acceleration
+        self.position = 0
+        # (start time, steps, duration) of the queued moves
+        self.moves = collections.deque()
+
+    @staticmethod
+    def move_duration(steps, velocity, acceleration):
+        '''
+        Duration in s of a move of the given number of steps
+        '''
+        steps = abs(steps)
+        ramp = velocity / acceleration
+        if steps >= velocity * ramp:
+            return steps / velocity + ramp
+        return 2 * (steps / acceleration) ** 0.5
+
+    def update(self, now):
+        '''
+        Apply the moves finished at the time now
+        '''
+        while self.moves and self.moves[0][0] + self.moves[0][2] <= now:
+            self.position += self.moves.popleft()[1]
+
+    def current_position(self, now):
+        self.update(now)
+        if not self.moves:
+            return self.position
+        start, steps, duration = self.moves[0]
+        fraction = min(1., max(0., (now - start) / duration)) if duration else 1.
+        return self.position + int(round(steps * fraction))
+
+    def queue_move(self, steps, now):
+        self.update(now)
+        start = now
+        if self.moves:
+            # Starts at the end of the previous move
+            start = self.moves[-1][0] + self.moves[-1][2]
+        self.moves.append((start, steps,
+                           self.move_duration(steps, self.velocity, self.acceleration)))
+
+    def stop(self, now):
+        self.position = self.current_position(now)
+        self.moves.clear()
+
+
+class Pico8742Simulator(object):
+    """
+    Command interpreter of a simulated 8742, with the interface of the USB
+    endpoints used by Pico8742Ctrl (write/read).
+
+    :param motor_types: Motor type of the axes 1 to 4 ("3": standard motor,
+                        "0": no motor)
+    :param time_scale: Speed of the simulated time relative to the real
+                       time, None to finish the moves instantly
+    :param queue_depth: Number of moves an axis accepts before reporting
+                        MOTION QUEUE FULL
+    :param latency: Duration in s of each USB transfer
+    :param address: RS-485 address of the controller
+    :param chain: Simulators of the other controllers of the RS-485 daisy
+                  chain, reached through this one
+    """
+    def __init__(self, motor_types=("3", "0", "0", "0"), time_scale=1.,
+                 queue_depth=8, latency=0., address=1, chain=()):
+        self.axes = dict((i + 1, SimulatedAxis(motor_type))
+                         for i, motor_type in enumerate(motor_types))
+        self.time_scale = time_scale
+        self.queue_depth = queue_depth
+        self.latency = latency
+        self.address = address
+        self.chain = dict((controller.address, controller) for controller in chain)
+        self.errors = collections.deque()
+        self.replies = collections.deque()
+        self.command_count = 0
+        self.lock = threading.Lock()
+        self.start = time.monotonic()
+
+    def now(self):
+        '''
+        Simulated time in s
+        '''
+        if self.time_scale is None:
+            return float("inf")
+        return (time.monotonic() - self.start) * self.time_scale
+
+    # USB endpoint interface
+
+    def write(self, usb_command):
+        if self.latency:
+            time.sleep(self.latency)
+        if isinstance(usb_command, (bytes, bytearray)):
+            usb_command = usb_command.decode("ascii")
+        with self.lock:
+            # Several commands can be sent at once, separated by ';'
+            for cmd in usb_command.strip("\r\n").split(";"):
+                if cmd.strip():
+                    self.execute(cmd)
+
+    def read(self, size):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            if not self.replies:
+                raise TimeoutError("No reply from the simulated controller")
+            reply = self.replies.popleft()
+        return [ord(c) for c in reply[:size]]
+
+    def close(self):
+        pass
+
+    # Command interpreter
+
+    def execute(self, cmd):
+        '''
+        Execute one command of the form "[address>][axis]CMD[parameter]"
+        '''
+        self.command_count += 1
+        match = USB_COMMAND_REGEX.match(cmd)
+        if match is None:
+            self.errors.append(6)
+            return
+        address, axis_number, command, parameter = match.groups()
+        if address and int(address) != self.address:
+            # Relayed on the RS-485 chain, no reply from a missing address
+            controller = self.chain.get(int(address))
+            if controller is not None:
+                with controller.lock:
+                    controller.execute(cmd)
+                    self.replies.extend(controller.replies)
+                    controller.replies.clear()
+            return
+        command = command.upper()
+        axis = self.axes.get(int(axis_number)) if axis_number else None
+        now = self.now()
+
+        value = None
+        if command == "VE?":
+            value = "New_Focus 8742 v2.2 08/01/13"
+        elif command == "*IDN?":
+            value = "New_Focus 8742 v2.2 08/01/13 SIMULATOR"
+        elif command == "TB?":
+            error = self.errors.popleft() if self.errors else 0
+            value = "%d, %s" % (error, ERROR_MESSAGES[error])
+        elif command == "TE?":
+            value = str(self.errors.popleft() if self.errors else 0)
+        elif command == "SC":
+            pass
+        elif command == "SD?":
+            value = "1"
+        elif command == "SC?":
+            value = str(sum(1 << chained for chained in
+                            [self.address] + list(self.chain)))
+        elif command == "ST":
+            for stopped in ([axis] if axis else self.axes.values()):
+                stopped.stop(now)
+        elif axis is None:
+            self.errors.append(6 if command not in ("PR", "PA", "TP?", "MD?", "VA", "VA?",
+                                                    "AC", "AC?", "QM?", "DH", "MV")
+                               else 7)
+        elif command == "QM?":
+            value = axis.motor_type
+        elif command == "TP?":
+            value = str(axis.current_position(now))
+        elif command == "MD?":
+            axis.update(now)
+            value = "0" if axis.moves else "1"
+        elif command == "VA?":
+            value = str(axis.velocity)
+        elif command == "AC?":
+            value = str(axis.acceleration)
+        elif command in ("VA", "AC") and parameter:
+            if int(parameter) <= 0:
+                self.errors.append(7)
+            elif command == "VA":
+                axis.velocity = int(parameter)
+            else:
+                axis.acceleration = int(parameter)
+        elif command in ("PR", "PA") and parameter:
+            axis.update(now)
+            if len(axis.moves) >= self.queue_depth:
+                self.errors.append(10)
+            else:
+                steps = int(parameter)
+                if command == "PA":
+                    target = axis.position + sum(move[1] for move in axis.moves)
+                    steps -= target
+                axis.queue_move(steps, now)
+        elif command == "DH":
+            axis.stop(now)
+            axis.position = int(parameter) if parameter else 0
+        elif command == "MV":
+            # Indefinite move, modelled as a long move in the direction given
+            axis.queue_move((-1 if parameter.startswith("-") else 1) * 2**31, now)
+        else:
+            self.errors.append(6)
+
+        if value is not None:
+            self.replies.append((address + ">" if address else "") + value + "\r\n")
+
+
+def load_test(cycles=1000, steps=100, time_scale=None, latency=0.):
+    '''
+    Run relative moves up and down through Pico8742Ctrl and measure the
+    command throughput.
+
+    :return: dict with "commands", "seconds", "commands_per_second" and the
+             final "position" (0 if no step was lost)
+    '''
+    simulator = Pico8742Simulator(time_scale=time_scale, latency=latency)
+    controller = Pico8742Ctrl(idProduct=None, idVendor=None, transport=simulator)
+    channel = str(controller.channel)
+    count = simulator.command_count
+    start = time.perf_counter()
+    for i in range(cycles):
+        direction = "+" if i % 2 == 0 else "-"
+        controller.command(f"{channel}PR{direction}{steps}")
+        while controller.command(f"{channel}MD?")[-1] != "1":
+            pass
+    position = controller.get_position()
+    elapsed = time.perf_counter() - start
+    commands = simulator.command_count - count
+    return {"commands": commands,
+            "seconds": elapsed,
+            "commands_per_second": commands / elapsed,
+            "position": int(position[position.find(">") + 1:])}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Load test of Pico8742Ctrl with a simulated 8742")
+    parser.add_argument("--cycles", type=int, default=1000)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--time-scale", type=float, default=None,
+                        help="simulated time speed (default: instant moves)")
+    parser.add_argument("--latency", type=float, default=0.,
+                        help="duration of each USB transfer in s")
+    args = parser.parse_args()
+    result = load_test(args.cycles, args.steps, args.time_scale, args.latency)
+    print(f"{result['commands']} commands in {result['seconds']:.3f} s "
+          f"({result['commands_per_second']:.0f} commands/s), "
+          f"final position {result['position']}")
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Acquisition clock shared by the interferometer, the motor and the power supply.
+"""
+
+
+import json
+import time
+
+# Clock metadata written next to each output file: <file><suffix>
+CLOCK_METADATA_SUFFIX = ".clock.json"
+
+
+class AcquisitionClock(object):
+    '''
+    Monotonic clock (time.perf_counter_ns) shared by all the devices, with
+    one origin also read on the system clock: the timestamps of all the
+    logs are on the same time base and don't jump when the system clock is
+    adjusted.
+
+    The timestamps given in seconds are the Unix time of the origin plus
+    the monotonic time elapsed since it, so they stay comparable with
+    datetime.datetime.now().timestamp().
+
+    :param samples: Number of reads of both clocks to find the origin, the
+                    pair read in the shortest time is kept
+
+    '''
+
+    def __init__(self, samples=5):
+        pairs = []
+        for _ in range(samples):
+            before = time.perf_counter_ns()
+            unix_ns = time.time_ns()
+            after = time.perf_counter_ns()
+            pairs.append((after - before, (before + after) // 2, unix_ns))
+        # Uncertainty of the origin (half the read time of the best pair)
+        read_time, self.origin_ns, self.origin_unix_ns = min(pairs)
+        self.origin_uncertainty_ns = read_time // 2
+        # Named instants of the acquisition (e.g. start of a recording)
+        self.anchors = {}
+
+    def now_ns(self):
+        return time.perf_counter_ns()
+
+    def to_timestamp(self, ns):
+        '''
+        Unix time in s of an instant of the monotonic clock
+        '''
+        return (self.origin_unix_ns + ns - self.origin_ns) / 1e9
+
+    def timestamp(self):
+        '''
+        Current Unix time in s on the monotonic clock
+        '''
+        return self.to_timestamp(time.perf_counter_ns())
+
+    def anchor(self, name, ns=None, uncertainty_ns=0):
+        '''
+        Record a named instant, now by default
+
+        :return: Instant in ns of the monotonic clock
+        '''
+        if ns is None:
+            ns = time.perf_counter_ns()
+        self.anchors[name] = (ns, uncertainty_ns)
+        return ns
+
+    def metadata(self, anchors=None):
+        '''
+        Parameters of the clock and of the anchors (all by default), as
+        strings to be written in the headers of the output files
+
+        :return: dict(str, str)
+        '''
+        metadata = {"clock": "time.perf_counter_ns",
+                    "clock_origin_ns": str(self.origin_ns),
+                    "clock_origin_unix_ns": str(self.origin_unix_ns),
+                    "clock_origin_uncertainty_ns": str(self.origin_uncertainty_ns)}
+        for name in (self.anchors if anchors is None else anchors):
+            ns, uncertainty_ns = self.anchors[name]
+            metadata[f"{name}_ns"] = str(ns)
+            metadata[f"{name}_unix"] = "%.9f" % self.to_timestamp(ns)
+            metadata[f"{name}_uncertainty_ns"] = str(uncertainty_ns)
+        return metadata
+
+    def write_metadata(self, file_path, anchors=None):
+        '''
+        Write the clock metadata next to an output file
+
+        :return: Path of the metadata file
+        '''
+        metadata_path = file_path + CLOCK_METADATA_SUFFIX
+        with open(metadata_path, "w") as metadata_file:
+            json.dump(self.metadata(anchors), metadata_file, indent=1)
+        return metadata_path
+
+
+# Clock of the application
+ACQUISITION_CLOCK = AcquisitionClock()
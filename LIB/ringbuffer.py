@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Sample and record buffers shared between an acquisition thread and the GUI.
+"""
+
+
+import numpy as np
+
+
+class RingBuffer(object):
+    '''
+    Preallocated circular buffer of samples for one producer thread
+    (e.g. the streaming worker) and one consumer thread (e.g. timerEvent).
+
+    No lock is used: the producer announces the end of the samples it is
+    about to write (reserved), copies them and publishes the new total
+    afterwards. The consumer drops the samples whose slots were reserved,
+    hence possibly overwritten, while it was copying them.
+
+    :param capacity: Number of samples kept in memory
+    :param dtype: Type of the samples
+
+    '''
+
+    def __init__(self, capacity, dtype=np.float64):
+        self.capacity = int(capacity)
+        self.dtype = np.dtype(dtype)
+        self._buffer = np.zeros(self.capacity, dtype=self.dtype)
+        # Total number of samples appended since creation, and total once
+        # the append in progress is done. Only the producer writes them.
+        self.total = 0
+        self.reserved = 0
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, values):
+        '''
+        Append samples. Must be called from the producer thread only.
+        If more samples than the capacity are given, only the last ones are
+        kept in memory.
+        '''
+        values = np.asarray(values, dtype=self.dtype).ravel()
+        count = values.shape[0]
+        if count == 0:
+            return
+
+        total = self.total
+        if count > self.capacity:
+            total += count - self.capacity
+            values = values[-self.capacity:]
+            count = self.capacity
+        # Published before the slots are written
+        self.reserved = total + count
+        start = total % self.capacity
+        first = min(count, self.capacity - start)
+        self._buffer[start:start + first] = values[:first]
+        self._buffer[:count - first] = values[first:]
+        self.total = total + count
+
+    def read_since(self, index):
+        '''
+        Copy the samples appended after the given total count.
+
+        :param index: Value of total at the previous read
+        :return: (new index, array of samples). Samples already overwritten
+                 are skipped, so the array may start later than index.
+        '''
+        total = self.total
+        start = max(index, total - self.capacity)
+        values = self._copy(start, total)
+        # Drop what the producer may have overwritten during the copy,
+        # including the slots of an append not published yet
+        overwritten = self.reserved - self.capacity - start
+        if overwritten > 0:
+            values = values[overwritten:]
+        return total, values
+
+    def snapshot(self, count=None):
+        '''
+        Copy of the last samples, oldest first.
+
+        :param count: Number of samples, all the available ones by default
+        '''
+        total = self.total
+        if count is None:
+            count = len(self)
+        return self.read_since(total - count)[1]
+
+    def _copy(self, start, stop):
+        first = start % self.capacity
+        count = stop - start
+        if count <= 0:
+            return np.empty(0, dtype=self.dtype)
+        if first + count <= self.capacity:
+            return self._buffer[first:first + count].copy()
+        return np.concatenate((self._buffer[first:],
+                               self._buffer[:first + count - self.capacity]))
+
+
+class RecordBuffer(object):
+    '''
+    Growable array of records (structured dtype, e.g. time/value/step)
+    appended by one producer thread and read by one consumer thread, with an
+    amortized O(1) append instead of np.append copying the whole history.
+
+    No lock is used: when the capacity is reached, the records are copied
+    into an array twice larger before it replaces the current one, and the
+    new total is published after the record is written. The records below
+    the total read by the consumer are the same in both arrays.
+
+    :param fields: List of (name, dtype) of the record columns
+    :param capacity: Initial number of records
+
+    '''
+
+    def __init__(self, fields, capacity=1024):
+        self.dtype = np.dtype(fields)
+        self._buffer = np.zeros(max(1, int(capacity)), dtype=self.dtype)
+        # Number of records appended. Only the producer writes it.
+        self.total = 0
+
+    def __len__(self):
+        return self.total
+
+    def append(self, *values):
+        '''
+        Append one record, values given in the order of the fields. Must be
+        called from the producer thread only.
+        '''
+        buffer = self._buffer
+        if self.total == buffer.shape[0]:
+            grown = np.zeros(2 * buffer.shape[0], dtype=self.dtype)
+            grown[:self.total] = buffer
+            self._buffer = buffer = grown
+        buffer[self.total] = values
+        self.total += 1
+
+    def read_since(self, index):
+        '''
+        Copy the records appended after the given total count.
+
+        :param index: Value of total at the previous read
+        :return: (new index, structured array of the records)
+        '''
+        total = self.total
+        return total, self._buffer[index:total].copy()
+
+    def column(self, name):
+        '''
+        Copy of one column of all the records
+        '''
+        total = self.total
+        return self._buffer[name][:total].copy()
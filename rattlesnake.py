@@ -19,6 +19,7 @@ from pathlib import Path
 import glob
 import json
 import logging
+import threading
 import usb
 import csv
 import numpy as np
@@ -31,7 +32,14 @@ from PyQt5.QtGui import QPixmap
 
 # Internal lib to read and command the motor
 from LIB.MOTOR.pico8742ctrl import Pico8742Ctrl
+from LIB.MOTOR.pico8742sim import Pico8742Simulator
 from LIB.workers import Worker
+from LIB.ringbuffer import RingBuffer, RecordBuffer
+from LIB.clock import ACQUISITION_CLOCK
+from LIB.AGILENT.sweep import plan_sweep, sweep_duration, run_sweep
+from LIB.AGILENT.visaqueue import VisaCommandQueue
+from LIB.AGILENT.sampler import ReadbackSampler
+from LIB.AGILENT.e3631sim import E3631ASimResourceManager
 #import LIB.ATTOCUBE.streaming.stream as ids_stream
 #import gui_interfero
 
@@ -39,10 +47,19 @@ from LIB.workers import Worker
 try:
     import LIB.ATTOCUBE.streaming.stream as ids_stream
     import gui_interfero
+    import IDS
     INTERFERO_LIB_MISSING = False
 except:
     print("No connexion possible with the IDS 3010 Interferometer")
     INTERFERO_LIB_MISSING = True
+# Internal lib to export the recorded streams (.aws files)
+try:
+    import LIB.ATTOCUBE.streaming.export as ids_export
+    EXPORT_LIB_MISSING = False
+except ImportError as err:
+    print(err)
+    print("Export of the recorded streams unavailable")
+    EXPORT_LIB_MISSING = True
 # Lib to connect Agilent power supply instrument 
 try:
     import pyvisa as visa
@@ -78,12 +95,28 @@ FILE_EXTENTION = None
 SESSIONFILENAME = None
 VERSION = None
 INTERFERO_IP = None
+# Use a simulated Picomotor controller instead of the USB device
+MOTOR_SIMULATOR = False
+# Stream port of LIB/ATTOCUBE/simulator.py to stream from the simulator
+INTERFERO_STREAM_SIMULATOR_PORT = None
+# Period (s) of the measurement of the power supply output during the
+# cycles, 0 to disable it
+AGILENT_READBACK_PERIOD = 0
+# Use a simulated E3631A instead of the VISA instruments
+AGILENT_SIMULATOR = False
 
 INTERFERO_INTERVAL_MICROSEC = 1000
 bandwidth = 1000
 BUFFERSIZE = int((min(1023, max(1, 1000000/bandwidth/25)) + 1 + 2) * 4)
 INTERFERO_TIME_RANGE_PLOT = 5          # time range of the plot in seconds
 MAX_BINS_PLOT = INTERFERO_TIME_RANGE_PLOT / (INTERFERO_INTERVAL_MICROSEC*1e-6)
+INTERFERO_RING_BUFFER_SIZE = 2**20     # samples kept in memory while streaming
+# Columns of the motor and power supply cycle logs
+MOTOR_RECORD_FIELDS = [("datetime", np.float64), ("pos", np.int64), ("step", np.int64)]
+AGILENT_RECORD_FIELDS = [("datetime", np.float64), ("voltage", np.float64)]
+AGILENT_READBACK_FIELDS = [("datetime", np.float64), ("voltage", np.float64),
+                           ("current", np.float64)]
+AGILENT_QUERY_TIMEOUT = 5              # s, replies waited by the GUI
 
 SESSIONDIRNAME = "gpsession"
 # ------------------------- FEW GLOBAL VARIABLES ----------------------------
@@ -167,6 +200,8 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
         self.actionAbout.triggered.connect(self.mw_open_about_dialog)
         self.actionHelp.setEnabled(False)
         self.actionExportWaveToCSV.triggered.connect(self.actionOpenWaveExport)
+        if EXPORT_LIB_MISSING:
+            self.actionExportWaveToCSV.setEnabled(False)
         self.mw_checkexist_or_create_dir()
         # Set Tab to "Motor"
         self.tabWidget.setCurrentIndex(0)
@@ -192,7 +227,7 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
             self.action_connect_interfero.setEnabled(False)
 
         self.interfero_recording_state = False
-        self.data = np.array([])
+        self.data = RingBuffer(INTERFERO_RING_BUFFER_SIZE, dtype=np.int64)
         self.graphicsView.setBackground((0, 0, 0))
         self.graphicsView.viewRect()
         self.windowWidth = 10000
@@ -235,32 +270,81 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
         self.displacement_interfero.showGrid(x=True, y=True)
         #self.displacement_interfero.setRange(xRange=[-self.windowWidth, 0])
         #self.displacement_interfero.setLimits(xMax=0)
-        self.curve_interfero = self.displacement_interfero.plot(self.data)
+        self.curve_interfero = self.displacement_interfero.plot(
+                                                        self.data.snapshot())
 
     def actionOpenWaveExport(self):
         """
-        Function to open WAVE Software to export AWS files to CSV files.
+        Function to export recorded AWS files to CSV, Parquet or HDF5 files.
+        The files are converted in a worker thread, next to the recordings.
 
         Returns
         -------
         None.
 
         """
-        import subprocess
-        WAVE_DIR = r"C:\Users\cave\Documents\RATTLESNAKE\WAVE"
-        wave_export_fn = os.path.join(WAVE_DIR, "WAVEExport.exe")
-        logging.info(f"RATTLE SNAKE: {wave_export_fn}")
-        try:
-            subprocess.Popen(wave_export_fn)
-            logging.info("RATTLE SNAKE: ATTOCUBE Wave Export Opening...")
-        except:
-            logging.info("RATTLE SNAKE: ATTOCUBE Wave Export Opening failed.")
-            msg = QtWidgets.QMessageBox()
-            msg.setIcon(QtWidgets.QMessageBox.Warning)
-            msg.setText("Unable to open WAVE Export")
-            msg.setWindowTitle("Wave Export unreachable.")
-            msg.setStandardButtons(QtWidgets.QMessageBox.Ok)
-            msg.exec_()
+        filenames, _ = QtWidgets.QFileDialog.getOpenFileNames(
+                                    self, "Select the recorded streams",
+                                    self.rs_custom_pref.get("record_dir"),
+                                    "ATTOCUBE streams (*.aws)")
+        if len(filenames) == 0:
+            return
+        fileformat, accepted = QtWidgets.QInputDialog.getItem(
+                                    self, "Export recorded streams",
+                                    "Output format:",
+                                    list(ids_export.FORMATS), 0, False)
+        if not accepted:
+            return
+        logging.info(f"RATTLE SNAKE: export of {len(filenames)} file(s) to {fileformat}")
+        worker = Worker(self.export_aws_files, filenames, fileformat)
+        worker.signals.result.connect(self.export_aws_files_done)
+        worker.signals.error.connect(self.export_aws_files_failed)
+        self.threadpool.start(worker)
+
+    def export_aws_files(self, filenames, fileformat):
+        """
+        Function executed in a worker thread to export AWS files
+
+        Parameters
+        ----------
+        filenames : list
+            Recorded stream files.
+        fileformat : str
+            "csv", "parquet" or "hdf5".
+
+        Returns
+        -------
+        outputs : list
+            Exported files.
+
+        """
+        outputs = []
+        for filename in filenames:
+            outputs.append(ids_export.exportFile(filename, fileFormat=fileformat))
+            logging.info(f"RATTLE SNAKE: {filename} exported to {outputs[-1]}")
+        return outputs
+
+    def export_aws_files_done(self, outputs):
+        """
+        Handler called when the export is finished
+        """
+        for output in outputs:
+            self.motor_console_message += f"> RATTLE SNAKE: exported {output}\n"
+        self.plainTextEditMotorConnexion.setPlainText(
+                                                self.motor_console_message)
+
+    def export_aws_files_failed(self, error):
+        """
+        Handler called when the export failed
+        """
+        logging.info(f"RATTLE SNAKE: export failed: {error[1]}")
+        msg = QtWidgets.QMessageBox()
+        msg.setIcon(QtWidgets.QMessageBox.Warning)
+        msg.setText("Unable to export the recorded streams")
+        msg.setInformativeText(str(error[1]))
+        msg.setWindowTitle("Export failed.")
+        msg.setStandardButtons(QtWidgets.QMessageBox.Ok)
+        msg.exec_()
 
     def mw_checkexist_or_create_dir(self):
         """
@@ -351,9 +435,7 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
         self.cb_record_at_start.setEnabled(False)
 
         self.motor_cycle_param_dict = {}
-        self.motor_position_vec = {"time": np.array([]),
-                                   "pos": np.array([]),
-                                   "datetime": np.array([])}
+        self.motor_position_vec = RecordBuffer(MOTOR_RECORD_FIELDS)
 
     def init_interfero(self):
         """
@@ -467,9 +549,7 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
         validator.setNotation(QtGui.QDoubleValidator.StandardNotation)
         self.le_agilent_jog_step_value.setValidator(validator)
         self.le_agilent_jog_voltage_value.setValidator(validator)
-        self.agilent_position_vec = {"time": np.array([]),
-                                     "voltage": np.array([]),
-                                     "datetime": np.array([])}
+        self.agilent_position_vec = RecordBuffer(AGILENT_RECORD_FIELDS)
         self.rs_custom_pref["record_prefix_agilent"] = DEFAULT_RECORD_PREFIX_AGILENT_FILE
 
     def closeEvent(self, event):
@@ -631,6 +711,23 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
         self.plainTextEditMotorConnexion.setPlainText(
                                                     self.motor_console_message)
 
+    def interfero_refresh_discovery(self):
+        """
+        Discover the interferometers on the network and update the discovery
+        cache (background thread)
+
+        Returns
+        -------
+        None.
+
+        """
+        try:
+            devices = IDS.discover()
+        except Exception as e:
+            logging.warning(f"INTERFERO: discovery failed: {e}")
+            return
+        logging.info(f"INTERFERO: {len(devices)} device(s) found: {', '.join(sorted(devices))}")
+
     def action_connectInterfero(self, interfero_ipaddress):
         """
         function to establish connexion with interferometer
@@ -641,6 +738,16 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
 
         """
         if self.interfero_connected is False:
+            # Without address in the config, connect right away to the
+            # device found by the last discovery
+            known_devices = IDS.knownDevices()
+            if not interfero_ipaddress and known_devices:
+                interfero_ipaddress = sorted(known_devices)[0]
+                logging.info(f"INTERFERO: {interfero_ipaddress} taken from the discovery cache")
+            # Refresh the cache for the next connections, without delaying
+            # this one
+            threading.Thread(target=self.interfero_refresh_discovery,
+                             name="IDS-discovery", daemon=True).start()
             self.ids = gui_interfero.IDS_IPGP(interfero_ipaddress)
 
             status = self.ids.connect()
@@ -902,6 +1009,12 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
                 else:
                     self.init_abs_pos = self.ids.displacement.getAbsolutePosition(
                         self.ids.master_axis)
+                    # Reference position read at the middle of its request
+                    issued_ns, completed_ns = self.ids.lastRequestTimes()
+                    if issued_ns is not None:
+                        ACQUISITION_CLOCK.anchor("interfero_reference_position",
+                                                 (issued_ns + completed_ns) // 2,
+                                                 (completed_ns - issued_ns) // 2)
                     self.lbl_ref_position_value.setText(str(self.init_abs_pos[1]))
                     logging.info(f"INTERFERO: Initial absolute position: {self.init_abs_pos[1]} pm")
                     self.interfero_start_meas = True
@@ -1050,15 +1163,17 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
 
     def interfero_read_streaming_data(self, buffersize):
         self.ids.master_axis = self.ids.axis.getMasterAxis()
+        # Buffers reused for every read of the stream
+        raw, positions = self.ids_stream.allocateBuffers(buffersize)
         while not self.stopsig:
-            _, axis0, axis1, axis2 = self.ids_stream.read(buffersize)
+            _, axis0, axis1, axis2 = self.ids_stream.readInto(raw, positions)
             if self.ids.master_axis == 0:
                 axis = axis0
             elif self.ids.master_axis == 1:
                 axis = axis1
             else:
                 axis = axis2
-            self.data = np.append(self.data, axis)
+            self.data.append(axis)
 
     def timerEvent(self, _):
         """
@@ -1070,7 +1185,7 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
         # ---------
         # Update interferometer data if start button pushed.
         if self.interfero_connected and self.interfero_start_meas:
-            new_len_data = len(self.data)
+            new_len_data = self.data.total
             old_len_data = self.lendata_temp
             #print(new_len_data, old_len_data)
             # Version cumulative du plot... trop gourmand en memoire
@@ -1090,35 +1205,36 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
             #     self.lendata_temp = new_len_data
 
             if new_len_data > old_len_data:
-                for i in range(old_len_data, new_len_data):
-                    self.disp_vec[:-1] = self.disp_vec[1:]  # shift data in the temporal mean 1 sample left
-                    self.disp_vec[-1] = float(self.data[i] / 1e9)  # vector containing the instantaneous values
-                    self.ptr -= 1
-                self.curve_interfero.setData(self.disp_vec, _callSync='off')
-                self.lendata_temp = new_len_data
+                self.lendata_temp, new_data = self.data.read_since(old_len_data)
+                # Shift the window once for all the new samples
+                nb_new = min(new_data.shape[0], self.disp_vec.shape[0])
+                if nb_new > 0:
+                    self.disp_vec[:-nb_new] = self.disp_vec[nb_new:]
+                    self.disp_vec[-nb_new:] = new_data[-nb_new:] / 1e9
+                    self.ptr -= new_data.shape[0]
+                x_plot, y_plot = minmax_decimate(
+                        np.arange(self.disp_vec.shape[0]), self.disp_vec,
+                        self.displacement_interfero.getViewBox().width())
+                self.curve_interfero.setData(x_plot, y_plot, _callSync='off')
             else:
                 pass
 
         if self.agilent_cycle_running:
-            new_len_data_agilent = len(self.agilent_position_vec.get("voltage"))
-            old_len_data_agilent = self.lendata_temp_agilent
-
-            if new_len_data_agilent > old_len_data_agilent:
-
-                for i in range(old_len_data_agilent, new_len_data_agilent):
-                    self.rt_voltage_agilent[self.ptr_agilent] = self.agilent_position_vec.get("voltage")[i]
-                    self.rt_time_agilent[self.ptr_agilent] = self.agilent_position_vec.get("datetime")[i]
-                    self.ptr_agilent += 1
-                    if self.ptr_agilent >= self.rt_voltage_agilent.shape[0]:
-                        tmp_pos_agilent = self.rt_voltage_agilent
-                        self.rt_voltage_agilent = np.empty(self.rt_voltage_agilent.shape[0]*2)
-                        self.rt_voltage_agilent[:tmp_pos_agilent.shape[0]] = tmp_pos_agilent
-                        tmp_time_agilent = self.rt_time_agilent
-                        self.rt_time_agilent = np.empty(self.rt_voltage_agilent.shape[0]*2)
-                        self.rt_time_agilent[:tmp_time_agilent.shape[0]] = tmp_time_agilent
-                    self.curve_motor.setData(
-                        self.rt_time_agilent[:self.ptr_agilent] - self.rt_time_agilent[0],
-                        self.rt_voltage_agilent[:self.ptr_agilent], _callSync='off')
+            new_len_data_agilent, new_records = self.agilent_position_vec.read_since(
+                                                    self.lendata_temp_agilent)
+
+            if new_records.shape[0] > 0:
+                self.rt_voltage_agilent, _ = append_to_plot_buffer(
+                    self.rt_voltage_agilent, self.ptr_agilent,
+                    new_records["voltage"])
+                self.rt_time_agilent, self.ptr_agilent = append_to_plot_buffer(
+                    self.rt_time_agilent, self.ptr_agilent,
+                    new_records["datetime"])
+                x_plot, y_plot = minmax_decimate(
+                    self.rt_time_agilent[:self.ptr_agilent] - self.rt_time_agilent[0],
+                    self.rt_voltage_agilent[:self.ptr_agilent],
+                    self.displacement_motor.getViewBox().width())
+                self.curve_motor.setData(x_plot, y_plot, _callSync='off')
                 self.lendata_temp_agilent = new_len_data_agilent
             else:
                 pass
@@ -1126,24 +1242,21 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
         # ---------
         # Update motor data if start button pushed.
         if self.motor_cycle_running:
-            new_len_datamotor = len(self.motor_position_vec.get("pos"))
-            old_len_datamotor = self.lendata_temp_motor
-
-            if new_len_datamotor > old_len_datamotor:
-                for i in range(old_len_datamotor, new_len_datamotor):
-                    self.rt_pos_motor[self.ptr_motor] = self.motor_position_vec.get("pos")[i]
-                    self.rt_time_motor[self.ptr_motor] = self.motor_position_vec.get("datetime")[i]
-                    self.ptr_motor += 1
-                    if self.ptr_motor >= self.rt_pos_motor.shape[0]:
-                        tmp_pos = self.rt_pos_motor
-                        self.rt_pos_motor = np.empty(self.rt_pos_motor.shape[0]*2)
-                        self.rt_pos_motor[:tmp_pos.shape[0]] = tmp_pos
-                        tmp_time = self.rt_time_motor
-                        self.rt_time_motor = np.empty.shape[0]*2
-                        self.rt_time_motor[:tmp_time.shape[0]] = tmp_time
-                    self.curve_motor.setData(self.rt_time_motor[:self.ptr_motor] - self.rt_time_motor[0],
-                                             self.rt_pos_motor[:self.ptr_motor],
-                                             _callSync='off')
+            new_len_datamotor, new_records = self.motor_position_vec.read_since(
+                                                    self.lendata_temp_motor)
+
+            if new_records.shape[0] > 0:
+                self.rt_pos_motor, _ = append_to_plot_buffer(
+                    self.rt_pos_motor, self.ptr_motor,
+                    new_records["pos"])
+                self.rt_time_motor, self.ptr_motor = append_to_plot_buffer(
+                    self.rt_time_motor, self.ptr_motor,
+                    new_records["datetime"])
+                x_plot, y_plot = minmax_decimate(
+                    self.rt_time_motor[:self.ptr_motor] - self.rt_time_motor[0],
+                    self.rt_pos_motor[:self.ptr_motor],
+                    self.displacement_motor.getViewBox().width())
+                self.curve_motor.setData(x_plot, y_plot, _callSync='off')
                 self.lendata_temp_motor = new_len_datamotor
             else:
                 pass
@@ -1169,6 +1282,8 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
         #self.displacement_interfero.clear()
 
         self.ptr = 0
+        self.data = RingBuffer(INTERFERO_RING_BUFFER_SIZE, dtype=np.int64)
+        self.lendata_temp = 0
         self.stopsig = False
         self.interfero_recording_state = False
         # Threads part
@@ -1187,10 +1302,21 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
                 interval_msec = int(1e6/self.rs_custom_pref["freq"])
                 # Following buffersize provided by ATTOCUBE
                 BUFFERSIZE = int((min(1023, max(1, 1000000/interval_msec/25))+1+2)*4)
-
-                self.ids_stream = ids_stream.Stream(INTERFERO_IP, True,
-                                                    interval_msec,
-                                                    **kwargs_stream)
+                # The device sends the samples by packets of up to 1/25 s:
+                # time between the first sample of a packet and its reception
+                self.interfero_stream_latency_ns = int(
+                        min(1023, max(1, 1000000/interval_msec/25)) * interval_msec * 1000)
+
+                if INTERFERO_STREAM_SIMULATOR_PORT:
+                    import simulator
+                    self.ids_stream = simulator.SimulatedStream(
+                                self.ids.ipaddress, True, interval_msec,
+                                port=int(INTERFERO_STREAM_SIMULATOR_PORT),
+                                **kwargs_stream)
+                else:
+                    self.ids_stream = ids_stream.Stream(self.ids.ipaddress, True,
+                                                        interval_msec,
+                                                        **kwargs_stream)
                 self.ids_stream.open()
 
                 logging.info(f"INTERFERO: start streaming @{interval_msec} Hz")
@@ -1230,7 +1356,18 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
             self.motor_console_message += f"> INTERFERO: start recording stream to {self.interfero_record_fn}.\n"
             self.plainTextEditMotorConnexion.setPlainText(
                                                     self.motor_console_message)
+            # Start of the recording on the acquisition clock: the time of
+            # the samples is counted from there. The first packet recorded
+            # may hold samples measured up to one packet duration earlier.
+            before_ns = ACQUISITION_CLOCK.now_ns()
             self.ids_stream.startRecording(self.interfero_record_fn)
+            after_ns = ACQUISITION_CLOCK.now_ns()
+            ACQUISITION_CLOCK.anchor("interfero_recording_start",
+                                     (before_ns + after_ns) // 2,
+                                     (after_ns - before_ns) // 2
+                                     + self.interfero_stream_latency_ns)
+            ACQUISITION_CLOCK.write_metadata(self.interfero_record_fn,
+                                             ["interfero_recording_start"])
             self.pb_measure_record.setStyleSheet("background-color: red")
             self.pb_measure_record.setText("Stop recording")
             self.interfero_recording_state = True
@@ -1321,8 +1458,10 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
             self.motor_id_product = int(DEFAULTIDPRODUCT, 16)
             self.motor_id_vendor = int(DEFAULTIDVENDOR, 16)
 
+            transport = Pico8742Simulator() if MOTOR_SIMULATOR else None
             self.picomotor = Pico8742Ctrl(idProduct=self.motor_id_product,
-                                          idVendor=self.motor_id_vendor)
+                                          idVendor=self.motor_id_vendor,
+                                          transport=transport)
 
             # If motor is connected, activate all the button to play with it
             if self.picomotor.message != "ERROR: Device not found":
@@ -1763,10 +1902,9 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
 
         # Empty the position dictionnary before start.
         self.motor_cycle_param_dict = {}
-        self.motor_position_vec = {"time": np.array([]),
-                                   "pos": np.array([]),
-                                   "datetime": np.array([])}
+        self.motor_position_vec = RecordBuffer(MOTOR_RECORD_FIELDS)
         self.ptr_motor = 0
+        self.lendata_temp_motor = 0
 
         logging.info(f"MOTOR: Setting-VELOCITY: {self.motor_default_vel}")
         logging.info(f"MOTOR: Setting-ACCELERATION: {self.motor_default_acc}")
@@ -1787,6 +1925,9 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
             self.plainTextEditMotorConnexion.setPlainText(
                                                     self.motor_console_message)
             self.motor_file_instance = open(self.motor_save_sequence_file, "a")
+            ACQUISITION_CLOCK.anchor("motor_cycle_start")
+            ACQUISITION_CLOCK.write_metadata(self.motor_save_sequence_file,
+                                             ["motor_cycle_start"])
             self.motor_file_instance_writer = csv.writer(
                                                     self.motor_file_instance)
         try:
@@ -2010,40 +2151,39 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
         self.rt_time_motor = np.array([])
         self.motor_step_counter = 0
         self.ptr_motor = 0
-        newdatetime = datetime.datetime.now().timestamp()
+        newdatetime = ACQUISITION_CLOCK.timestamp()
         self.motor_start_cycle_time = newdatetime  # Used in filename
-        np.append(self.motor_position_vec["datetime"], newdatetime)
-        np.append(self.motor_position_vec["pos"], newpos)
         self.rt_pos_motor = np.repeat(newpos, nbstep*len(dictdirection[cycletype]))
-        self.rt_time_motor = np.repeat(0, nbstep*len(dictdirection[cycletype]))
+        self.rt_time_motor = np.repeat(0., nbstep*len(dictdirection[cycletype]))
 
         #if not self.stop_the_motor:
         for motordir in dictdirection[cycletype]:
             for _ in range(0, nbcycle):
                 if not self.stop_the_motor:
                     self.motor_step_counter += 1
-                    # Get time before motor command
-                    self.motor_position_vec["datetime"] = \
-                        np.append(self.motor_position_vec["datetime"],
-                                  newdatetime)
-                    self.motor_position_vec["pos"] = np.append(
-                                            self.motor_position_vec["pos"],
-                                            newpos)
-                    if self.save_data_from_motor_cycle:
-                        self.motor_file_instance_writer.writerow((newdatetime, newpos,
-                                                           self.motor_step_counter))
                     # Motor command
                     motorcmd = f"{channel}PR{motordir}{nbstep}"
                     self.picomotor.command(motorcmd)
 
-                    # Get time AFTER motor command
-                    newdatetime = datetime.datetime.now().timestamp()
+                    # Start of the motion: end of the USB transfer of the command
+                    newdatetime = ACQUISITION_CLOCK.to_timestamp(
+                                                    self.picomotor.completed_ns)
+                    self.motor_position_vec.append(newdatetime, newpos,
+                                                    self.motor_step_counter)
+                    if self.save_data_from_motor_cycle:
+                        self.motor_file_instance_writer.writerow((newdatetime, newpos,
+                                                           self.motor_step_counter))
+
+                    # Get time at the END of the motion
+                    donedatetime = self.picomotor.wait_motion_done(
+                                        channel, abort=lambda: self.stop_the_motor,
+                                        clock=ACQUISITION_CLOCK.timestamp)
+                    newdatetime = donedatetime if donedatetime is not None \
+                        else ACQUISITION_CLOCK.timestamp()
                     nbsteptoadd = f"{motordir}{nbstep}"
                     newpos = newpos + int(nbsteptoadd)
-                    self.motor_position_vec["datetime"] = \
-                        np.append(self.motor_position_vec["datetime"], newdatetime)
-                    self.motor_position_vec["pos"]= np.append(
-                                            self.motor_position_vec["pos"], newpos)
+                    self.motor_position_vec.append(newdatetime, newpos,
+                                                    self.motor_step_counter)
                     if self.save_data_from_motor_cycle:
                         self.motor_file_instance_writer.writerow((newdatetime, newpos,
                                                            self.motor_step_counter))
@@ -2051,11 +2191,9 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
                     time.sleep(dwelltime)
 
                     # Get time after pause
-                    newdatetime = datetime.datetime.now().timestamp()
-                    self.motor_position_vec["datetime"] = \
-                        np.append(self.motor_position_vec["datetime"], newdatetime)
-                    self.motor_position_vec["pos"] = np.append(
-                                        self.motor_position_vec["pos"], newpos)
+                    newdatetime = ACQUISITION_CLOCK.timestamp()
+                    self.motor_position_vec.append(newdatetime, newpos,
+                                                    self.motor_step_counter)
                     if self.save_data_from_motor_cycle:
                         self.motor_file_instance_writer.writerow((newdatetime, newpos,
                                                            self.motor_step_counter))
@@ -2112,22 +2250,25 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
     
         """
         if not self.agilent_connected:
-            rm = visa.ResourceManager()
+            rm = E3631ASimResourceManager() if AGILENT_SIMULATOR \
+                else visa.ResourceManager()
             res = rm.list_resources()
             logging.info("AGILENT: Connexion to the power supply.")
             if len(res) != 0:
                 try:
-                    self.agilent_instance = rm.open_resource(res[-1])
+                    # All the I/O of the power supply in its own thread
+                    self.agilent_instance = VisaCommandQueue(
+                                    rm.open_resource(res[-1]), name="AGILENT")
                     try:
-                        self.agilent_instance.query("*IDN?")
+                        self.agilent_instance.query("*IDN?").result(
+                                                    AGILENT_QUERY_TIMEOUT)
                         cmd = "".join([str(self.agilent_param_dict["mode"]), " V"])
                         if self.cb_agilent_voltage_setup.currentText() != cmd:
-                            time.sleep(1)
+                            self.agilent_instance.wait(1)
                             cmd = cmd.replace("+", "P")
                             cmd = cmd.replace("-", "N")
                             cmd = cmd.replace(" ", "")
                             cmd =  "".join(["INST ", cmd])
-                            print(cmd)
                             logging.info(f"AGILENT: mode changed to {cmd}")
                             self.motor_console_message += f"> AGILENT: mode changed to {cmd}.\n"
                             self.plainTextEditMotorConnexion.setPlainText(
@@ -2161,6 +2302,13 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
                                          units="s")
                         self.agilent_instance.write("OUTP ON")
                     except:
+                        # No I/O thread nor VISA resource left open on a
+                        # device which does not answer
+                        try:
+                            self.agilent_instance.close(AGILENT_QUERY_TIMEOUT)
+                        except Exception as e:
+                            logging.warning(f"AGILENT: closing failed: {e}")
+                        self.agilent_instance = None
                         logging.info("AGILENT: ERROR - device probably off.")
                         self.motor_console_message += "> AGILENT: ERROR - device probably off.\n"
                         self.plainTextEditMotorConnexion.setPlainText(
@@ -2365,7 +2513,7 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
                         f"> AGILENT: Jog Mode - voltage set to {cmd}\n"
             self.plainTextEditMotorConnexion.setPlainText(
                                                         self.motor_console_message)
-            time.sleep(1)
+            self.agilent_instance.wait(1)
             self.agilent_instance.write("OUTP ON")
 
     def agilent_jog_add_voltage(self):
@@ -2474,15 +2622,16 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
                 self.plainTextEditMotorConnexion.setPlainText(
                                                         self.motor_console_message)
                 self.agilent_file_instance = open(self.agilent_save_sequence_file, "a")
+                ACQUISITION_CLOCK.anchor("agilent_cycle_start")
+                ACQUISITION_CLOCK.write_metadata(self.agilent_save_sequence_file,
+                                                 ["agilent_cycle_start"])
                 self.agilent_file_instance_writer = csv.writer(
                                                         self.agilent_file_instance)
                 logging.info("AGILENT: File opened...")
             try:
                 if not self.agilent_run_status:
                     # self.data = np.array([])
-                    self.agilent_position_vec = {"time": np.array([]),
-                                                 "voltage": np.array([]),
-                                                 "datetime": np.array([])}
+                    self.agilent_position_vec = RecordBuffer(AGILENT_RECORD_FIELDS)
                     self.rt_voltage_agilent = np.array([])
                     self.rt_time_agilent = np.array([])
                     self.ptr_agilent = 0
@@ -2593,262 +2742,74 @@ class GuiPioneersMainWindow(QtWidgets.QMainWindow):
         # current = int(kwargs.get("current"))
         back2vmin = True if kwargs.get("back2vmin") else False
         cycletype = kwargs.get("cycletype")
-        dictdirection = {}
-        dictdirection["up"] = ["+"]
-        dictdirection["down"] = ["-"]
-        dictdirection["updown"] = ["+", "-"]
         startpos = vmin
         newpos = startpos
+        # Whole (time, voltage) schedule of the cycle
+        sweep_plan = plan_sweep(vmin, vmax, vstep, dwelltime, dwelltimelow,
+                                cycletype, back2vmin)
+        logging.info(f"AGILENT: {sweep_plan.shape[0]} voltage steps, "
+                     f"planned duration {sweep_duration(sweep_plan)} s")
         # Send output on command in case of restart another cycle
         self.agilent_instance.write("OUTP ON")
 
         self.agilent_cycle_running = True
         self.agilentwindowWidth = 100
 
-        newdatetime = datetime.datetime.now().timestamp()
+        newdatetime = ACQUISITION_CLOCK.timestamp()
         self.motor_start_cycle_time = newdatetime  # Used in filename
-        np.append(self.agilent_position_vec["datetime"], newdatetime)
-        np.append(self.agilent_position_vec["voltage"], newpos)
-        self.rt_voltage_agilent = np.repeat(newpos, int(((vmax-vmin)+2)/vstep))
-        self.rt_time_agilent = np.repeat(0, int(((vmax-vmin)+2)/vstep))
+        self.rt_voltage_agilent = np.repeat(newpos, 2 * sweep_plan.shape[0])
+        self.rt_time_agilent = np.repeat(0., 2 * sweep_plan.shape[0])
+
+        def set_voltage(v):
+            cmd2ps = "VOLT {:.1f}".format(v)
+            # Wait for the write: the step is timestamped once sent
+            sent = self.agilent_instance.write(cmd2ps)
+            sent.result()
+            logging.info(f"AGILENT: Command: {cmd2ps} -> New voltage: {v}")
+            return ACQUISITION_CLOCK.to_timestamp(sent.completed_ns)
+
+        def record_voltage(newdatetime, v):
+            self.agilent_position_vec.append(newdatetime, v)
+            if self.agilent_param_dict["savedata"]:
+                try:
+                    self.agilent_file_instance_writer.writerow((newdatetime, v))
+                except:
+                    pass
+
+        # Measured output of the power supply, sampled during the sweep
+        self.agilent_readback_vec = RecordBuffer(AGILENT_READBACK_FIELDS)
+        readback_files = []
+
+        def record_readback(newdatetime, v, i):
+            self.agilent_readback_vec.append(newdatetime, v, i)
+            for readback_file in readback_files:
+                csv.writer(readback_file).writerow((newdatetime, v, i))
 
         if not self.stop_agilent:
-            if cycletype == "updown":
-                for v in np.arange(vmin, vmax+vstep, vstep):
-                    if not self.stop_agilent:
-                        newdatetime = datetime.datetime.now().timestamp()
-                        self.agilent_position_vec["datetime"] = \
-                                np.append(self.agilent_position_vec["datetime"],
-                                          newdatetime)
-                        self.agilent_position_vec["voltage"] = np.append(
-                                                self.agilent_position_vec["voltage"], v)
-                        if self.agilent_param_dict["savedata"]:
-                            try:
-                                self.agilent_file_instance_writer.writerow(
-                                                                (newdatetime, v))
-                            except:
-                                pass
-    
-                        cmd2ps = "VOLT {:.1f}".format(v)
-                        self.agilent_instance.write(cmd2ps)
-                        time.sleep(dwelltime)
-                        # Save the data
-                        newdatetime = datetime.datetime.now().timestamp()
-                        self.agilent_position_vec["datetime"] = \
-                                np.append(self.agilent_position_vec["datetime"], 
-                                          newdatetime)
-                        self.agilent_position_vec["voltage"] = np.append(
-                                                self.agilent_position_vec["voltage"], v)
-                        if self.agilent_param_dict["savedata"]:
-                            try:
-                                self.agilent_file_instance_writer.writerow(
-                                                                (newdatetime, v))
-                            except:
-                                pass
-                        logging.info(f"AGILENT: Command: {cmd2ps} -> New voltage: {v}")
-                        if back2vmin and v != vmin:
-                            self.agilent_position_vec["datetime"] = \
-                                np.append(self.agilent_position_vec["datetime"], 
-                                          newdatetime)
-                            self.agilent_position_vec["voltage"] = np.append(
-                                                self.agilent_position_vec["voltage"], vmin)
-                            if self.agilent_param_dict["savedata"]:
-                                try:
-                                    self.agilent_file_instance_writer.writerow(
-                                                                (newdatetime, vmin))
-                                except:
-                                    pass
-                            cmd2psvmin = "VOLT {:.1f}".format(vmin)
-                            self.agilent_instance.write(cmd2psvmin)
-                            time.sleep(dwelltimelow)
-                            logging.info(f"AGILENT: Command: {cmd2psvmin} -> New voltage: {vmin}")
-                            newdatetime = datetime.datetime.now().timestamp()
-                            self.agilent_position_vec["datetime"] = \
-                                np.append(self.agilent_position_vec["datetime"], 
-                                          newdatetime)
-                            self.agilent_position_vec["voltage"] = np.append(
-                                                self.agilent_position_vec["voltage"], vmin)
-                            if self.agilent_param_dict["savedata"]:
-                                try:
-                                    self.agilent_file_instance_writer.writerow(
-                                                                (newdatetime, vmin))
-                                except:
-                                    pass
-                for v in np.arange(vmax-vstep, vmin-vstep, -vstep):
-                    if not self.stop_agilent:
-                        newdatetime = datetime.datetime.now().timestamp()
-                        self.agilent_position_vec["datetime"] = \
-                                np.append(self.agilent_position_vec["datetime"],
-                                          newdatetime)
-                        self.agilent_position_vec["voltage"] = np.append(
-                                                self.agilent_position_vec["voltage"], v)
-                        if self.agilent_param_dict["savedata"]:
-                            try:
-                                self.agilent_file_instance_writer.writerow(
-                                                                (newdatetime, v))
-                            except:
-                                pass
-                        cmd2ps = "VOLT {:.1f}".format(v)
-                        self.agilent_instance.write(cmd2ps)
-                        time.sleep(dwelltime)
-                        logging.info(f"AGILENT: Command: {cmd2ps} -> New voltage: {v}")
-                        newdatetime = datetime.datetime.now().timestamp()
-                        self.agilent_position_vec["datetime"] = \
-                                np.append(self.agilent_position_vec["datetime"], 
-                                          newdatetime)
-                        self.agilent_position_vec["voltage"] = np.append(
-                                                self.agilent_position_vec["voltage"], v)
-                        if self.agilent_param_dict["savedata"]:
-                            try:
-                                self.agilent_file_instance_writer.writerow(
-                                                                (newdatetime, v))
-                            except:
-                                pass
-                        if back2vmin and v != vmin:
-                            self.agilent_position_vec["datetime"] = \
-                                np.append(self.agilent_position_vec["datetime"], 
-                                          newdatetime)
-                            self.agilent_position_vec["voltage"] = np.append(
-                                                self.agilent_position_vec["voltage"], vmin)
-                            if self.agilent_param_dict["savedata"]:
-                                try:
-                                    self.agilent_file_instance_writer.writerow(
-                                                                (newdatetime, vmin))
-                                except:
-                                    pass
-                            cmd2psvmin = "VOLT {:.1f}".format(vmin)
-                            self.agilent_instance.write(cmd2psvmin)
-                            time.sleep(dwelltimelow)
-                            logging.info(f"AGILENT: Command: {cmd2psvmin} -> New voltage: {vmin}")
-                            newdatetime = datetime.datetime.now().timestamp()
-                            self.agilent_position_vec["datetime"] = \
-                                np.append(self.agilent_position_vec["datetime"], 
-                                          newdatetime)
-                            self.agilent_position_vec["voltage"] = np.append(
-                                                self.agilent_position_vec["voltage"], vmin)
-                            if self.agilent_param_dict["savedata"]:
-                                try:
-                                    self.agilent_file_instance_writer.writerow(
-                                                                    (newdatetime, vmin))
-                                except:
-                                    pass
-            # self.agilent_instance.write("OUTP OFF")
-            elif cycletype == "up":
-                for v in np.arange(vmin, vmax+vstep, vstep):
-                    if not self.stop_agilent:
-                        newdatetime = datetime.datetime.now().timestamp()
-                        self.agilent_position_vec["datetime"] = \
-                                np.append(self.agilent_position_vec["datetime"],
-                                          newdatetime)
-                        self.agilent_position_vec["voltage"] = np.append(
-                                                self.agilent_position_vec["voltage"], v)
-                        if self.agilent_param_dict["savedata"]:
-                            try:
-                                self.agilent_file_instance_writer.writerow(
-                                                                (newdatetime, v))
-                            except:
-                                pass
-                        cmd2ps = "VOLT {:.1f}".format(v)
-                        self.agilent_instance.write(cmd2ps)
-                        time.sleep(dwelltime)
-                        # Save the data
-                        newdatetime = datetime.datetime.now().timestamp()
-                        self.agilent_position_vec["datetime"] = \
-                                np.append(self.agilent_position_vec["datetime"], 
-                                          newdatetime)
-                        self.agilent_position_vec["voltage"] = np.append(
-                                                self.agilent_position_vec["voltage"], v)
-                        if self.agilent_param_dict["savedata"]:
-                            try:
-                                self.agilent_file_instance_writer.writerow(
-                                                                (newdatetime, v))
-                            except:
-                                pass
-                        logging.info(f"AGILENT: Command: {cmd2ps} -> New voltage: {v}")
-                        if back2vmin and v != vmin:
-                            self.agilent_position_vec["datetime"] = \
-                                np.append(self.agilent_position_vec["datetime"], 
-                                          newdatetime)
-                            self.agilent_position_vec["voltage"] = np.append(
-                                                self.agilent_position_vec["voltage"], vmin)
-                            if self.agilent_param_dict["savedata"]:
-                                try:
-                                    self.agilent_file_instance_writer.writerow(
-                                                                (newdatetime, vmin))
-                                except:
-                                    pass
-                            cmd2psvmin = "VOLT {:.1f}".format(vmin)
-                            self.agilent_instance.write(cmd2psvmin)
-                            time.sleep(dwelltimelow)
-                            logging.info(f"AGILENT: Command: {cmd2psvmin} -> New voltage: {vmin}")
-                            newdatetime = datetime.datetime.now().timestamp()
-                            self.agilent_position_vec["datetime"] = \
-                                np.append(self.agilent_position_vec["datetime"],
-                                          newdatetime)
-                            self.agilent_position_vec["voltage"] = np.append(
-                                                self.agilent_position_vec["voltage"], vmin)
-                            if self.agilent_param_dict["savedata"]:
-                                self.agilent_file_instance_writer.writerow(
-                                                                (newdatetime, vmin))
-            else:
-                for v in np.arange(vmax-vstep, vmin-vstep, -vstep):
-                    if not self.stop_agilent:
-                        newdatetime = datetime.datetime.now().timestamp()
-                        self.agilent_position_vec["datetime"] = \
-                                np.append(self.agilent_position_vec["datetime"],
-                                          newdatetime)
-                        self.agilent_position_vec["voltage"] = np.append(
-                                                self.agilent_position_vec["voltage"], v)
-                        if self.agilent_param_dict["savedata"]:
-                            try:
-                                self.agilent_file_instance_writer.writerow(
-                                                                (newdatetime, v))
-                            except:
-                                pass
-                        cmd2ps = "VOLT {:.1f}".format(v)
-                        self.agilent_instance.write(cmd2ps)
-                        time.sleep(dwelltime)
-                        logging.info(f"AGILENT: Command: {cmd2ps} -> New voltage: {v}")
-                        newdatetime = datetime.datetime.now().timestamp()
-                        self.agilent_position_vec["datetime"] = \
-                                np.append(self.agilent_position_vec["datetime"], 
-                                          newdatetime)
-                        self.agilent_position_vec["voltage"] = np.append(
-                                                self.agilent_position_vec["voltage"], v)
-                        if self.agilent_param_dict["savedata"]:
-                            try:
-                                self.agilent_file_instance_writer.writerow(
-                                                                (newdatetime, v))
-                            except:
-                                pass
-                        if back2vmin and v != vmin:
-                            self.agilent_position_vec["datetime"] = \
-                                np.append(self.agilent_position_vec["datetime"], 
-                                          newdatetime)
-                            self.agilent_position_vec["voltage"] = np.append(
-                                                self.agilent_position_vec["voltage"], vmin)
-                            if self.agilent_param_dict["savedata"]:
-                                try:
-                                    self.agilent_file_instance_writer.writerow(
-                                                                (newdatetime, vmin))
-                                except:
-                                    pass
-                            cmd2psvmin = "VOLT {:.1f}".format(vmin)
-                            self.agilent_instance.write(cmd2psvmin)
-                            time.sleep(dwelltimelow)
-                            logging.info(f"AGILENT: Command: {cmd2psvmin} -> New voltage: {vmin}")
-                            newdatetime = datetime.datetime.now().timestamp()
-                            self.agilent_position_vec["datetime"] = \
-                                np.append(self.agilent_position_vec["datetime"], 
-                                          newdatetime)
-                            self.agilent_position_vec["voltage"] = np.append(
-                                                self.agilent_position_vec["voltage"], vmin)
-                            if self.agilent_param_dict["savedata"]:
-                                try:
-                                    self.agilent_file_instance_writer.writerow(
-                                                                    (newdatetime, vmin))
-                                except:
-                                    pass
+            sampler = None
+            if AGILENT_READBACK_PERIOD > 0:
+                if self.agilent_param_dict["savedata"]:
+                    readback_file_path = os.path.splitext(
+                        self.agilent_save_sequence_file)[0] + "_readback.csv"
+                    readback_files.append(open(readback_file_path, "a"))
+                    ACQUISITION_CLOCK.write_metadata(readback_file_path,
+                                                     ["agilent_cycle_start"])
+                sampler = ReadbackSampler(self.agilent_instance,
+                                          AGILENT_READBACK_PERIOD, record_readback,
+                                          timeout=AGILENT_QUERY_TIMEOUT)
+                sampler.start()
+            try:
+                run_sweep(sweep_plan, set_voltage, record_voltage,
+                          lambda: self.stop_agilent,
+                          timestamp=ACQUISITION_CLOCK.timestamp)
+            finally:
+                # Also on a failed command: no sampler left querying the
+                # instrument, no readback file left open
+                if sampler is not None:
+                    sampler.stop()
+                    logging.info(f"AGILENT: {sampler.sample_count} readback measurements")
+                for readback_file in readback_files:
+                    readback_file.close()
 
             # self.agilent_instance.write("OUTP OFF")
             self.agilent_cycle_running = False
@@ -2933,6 +2894,73 @@ class IDS3010_preference_windows(QtWidgets.QDialog):
         self.user_interface = uic.loadUi(UI_PREF_WINDOW, self)
 
 
+def append_to_plot_buffer(buffer, ptr, values):
+    """
+    Function to copy a block of values at the end of a plot buffer.
+    The buffer size is doubled when it is full.
+
+    Parameters
+    ----------
+    buffer : numpy array
+        Plot buffer, filled up to ptr.
+    ptr : int
+        Number of values already in the buffer.
+    values : numpy array
+        New values.
+
+    Returns
+    -------
+    buffer : numpy array
+        The same buffer or a bigger copy.
+    ptr : int
+        New number of values in the buffer.
+
+    """
+    new_ptr = ptr + len(values)
+    if new_ptr > buffer.shape[0]:
+        new_buffer = np.empty(max(2*buffer.shape[0], new_ptr))
+        new_buffer[:ptr] = buffer[:ptr]
+        buffer = new_buffer
+    buffer[ptr:new_ptr] = values
+    return buffer, new_ptr
+
+
+def minmax_decimate(x, y, nb_pixels):
+    """
+    Function to reduce a curve to the min and max of each pixel column
+    before giving it to pyqtgraph.
+
+    Parameters
+    ----------
+    x : numpy array
+        Abscissa of the curve.
+    y : numpy array
+        Values of the curve.
+    nb_pixels : float
+        Width of the plot in pixels. Nothing is done if 0 (plot not shown
+        yet).
+
+    Returns
+    -------
+    x, y : numpy arrays
+        Decimated curve with 2 points (min then max) per pixel, or the input
+        curve if it is already small enough.
+
+    """
+    nb_pixels = int(nb_pixels)
+    if nb_pixels <= 0 or y.shape[0] <= 2 * nb_pixels:
+        return x, y
+    bin_size = y.shape[0] // nb_pixels
+    # Keep the most recent samples when the size is not a multiple
+    start = y.shape[0] - bin_size * nb_pixels
+    y_bins = y[start:].reshape(nb_pixels, bin_size)
+    x_dec = np.repeat(x[start::bin_size], 2)
+    y_dec = np.empty(2 * nb_pixels)
+    y_dec[0::2] = y_bins.min(axis=1)
+    y_dec[1::2] = y_bins.max(axis=1)
+    return x_dec, y_dec
+
+
 def read_config_file(jsonfile):
     """
     Function to read the JSON config file
@@ -2971,11 +2999,12 @@ def main():
     global SETUP_PARAM_FILE, CONFIG_DICT, VERSION, SESSIONFILENAME,\
         FILE_EXTENTION, FILESESSIONPREFIX, MAXACCELERATION, MAXVELOCITY, \
         MINDWELLTIME, MESSAGEMOTORDISCONNECTED, DEFAULTIDVENDOR, \
-        DEFAULTIDPRODUCT, MAXNUMBEROFCYCLE, MAXNUMBEROFDWELL, GP_DISCLAIMER
+        DEFAULTIDPRODUCT, MAXNUMBEROFCYCLE, MAXNUMBEROFDWELL, GP_DISCLAIMER,\
+        MOTOR_SIMULATOR
     global MESSAGEMOTORDISCONNECTED, MESSAGEMOTORPERMISSIONERROR,\
         MESSAGEMOTORALREADYCONNECTED, DEFAULT_WAVE_LOCATION
     global INTERFERO_IP, INTERFERO_INTERVAL_MICROSEC,\
-        INTERFERO_TIME_RANGE_PLOT, INTERFERO_XLABEL_PLOT,\
+        INTERFERO_STREAM_SIMULATOR_PORT, INTERFERO_TIME_RANGE_PLOT, INTERFERO_XLABEL_PLOT,\
         INTERFERO_YLABEL_PLOT, DEFAULT_RECORD_DIR, DEFAULT_RECORD_PREFIX_FILE,\
         DEFAULT_RECORD_PREFIX_MOTOR_FILE
 
@@ -2983,7 +3012,8 @@ def main():
     global AGILENT_VOLT_SETUP, AGILENT_DWELL_TIME, AGILENT_VOLT_MIN,\
         AGILENT_VOLT_STEP, AGILENT_VOLT_MAX, AGILENT_CURRENT,\
         AGILENT_INSTR_RESSOURCE, DEFAULT_RECORD_PREFIX_AGILENT_FILE,\
-        AGILENT_DWELL_TIME_LOW, AGILENT_JOG_STEP, AGILENT_JOG_VOLTAGE
+        AGILENT_DWELL_TIME_LOW, AGILENT_JOG_STEP, AGILENT_JOG_VOLTAGE,\
+        AGILENT_READBACK_PERIOD, AGILENT_SIMULATOR
 
     CONFIG_DICT = read_config_file(SETUP_PARAM_FILE)
     if CONFIG_DICT is not None:
@@ -3000,6 +3030,7 @@ def main():
 
         DEFAULTIDPRODUCT = CONFIG_DICT.get("DEFAULTIDPRODUCT")
         DEFAULTIDVENDOR = CONFIG_DICT.get("DEFAULTIDVENDOR")
+        MOTOR_SIMULATOR = CONFIG_DICT.get("MOTOR_SIMULATOR", "0") == "1"
 
         MINDWELLTIME = CONFIG_DICT.get("MINDWELLTIME")
         MAXVELOCITY = CONFIG_DICT.get("MAXVELOCITY")
@@ -3011,6 +3042,7 @@ def main():
 
         # Specific to the interferometer
         INTERFERO_IP = CONFIG_DICT.get("INTERFERO_IP")
+        INTERFERO_STREAM_SIMULATOR_PORT = CONFIG_DICT.get("INTERFERO_STREAM_SIMULATOR_PORT")
         INTERFERO_INTERVAL_MICROSEC = int(CONFIG_DICT.get("INTERFERO_INTERVAL_MICROSEC"))
         INTERFERO_TIME_RANGE_PLOT = int(CONFIG_DICT.get("INTERFERO_TIME_RANGE_PLOT"))
         INTERFERO_XLABEL_PLOT = CONFIG_DICT.get("INTERFERO_XLABEL_PLOT")
@@ -3033,6 +3065,8 @@ def main():
         DEFAULT_RECORD_PREFIX_AGILENT_FILE = CONFIG_DICT.get("DEFAULT_RECORD_PREFIX_AGILENT_FILE")
         AGILENT_JOG_STEP = CONFIG_DICT.get("AGILENT_JOG_STEP")
         AGILENT_JOG_VOLTAGE = CONFIG_DICT.get("AGILENT_JOG_VOLTAGE")
+        AGILENT_READBACK_PERIOD = float(CONFIG_DICT.get("AGILENT_READBACK_PERIOD", "0"))
+        AGILENT_SIMULATOR = CONFIG_DICT.get("AGILENT_SIMULATOR", "0") == "1"
         # set an print the splash screen
         pixmap = QPixmap(os.path.join(
             CURRENT_FILE_DIR, 'images', "splash_guipionner.png"))